@@ -1,25 +1,227 @@
+import ctypes
+import getpass
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import traceback
 
 from PySide2 import QtCore
 import maya.cmds as cmds
+import maya.mel as mel
 import maya.OpenMaya as om
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import maya.api.OpenMayaUI as omui2
+
+import playblast_cache
+import playblast_encode
+import playblast_log
+import playblast_template
+
+
+class FfmpegProcess(QtCore.QObject):
+    """
+    Runs ffmpeg through a QProcess so Maya keeps running while it encodes, and parses its -progress output.
+    """
+
+    PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+
+    # frame, frames per second
+    progress_updated = QtCore.Signal(int, float)
+    output_logged = QtCore.Signal(str)
+    # exit code, -1 if ffmpeg failed to start or was killed
+    finished = QtCore.Signal(int)
+
+    def __init__(self, ffmpeg_path, args, parent=None):
+        super(FfmpegProcess, self).__init__(parent)
+
+        self.ffmpeg_path = ffmpeg_path
+        self.args = FfmpegProcess.PROGRESS_ARGS + args
+
+        self.progress = {}
+        self.stdout_buffer = b""
+        self.stderr_buffer = b""
+        self.is_finished = False
+
+        self.process = QtCore.QProcess(self)
+        self.process.readyReadStandardOutput.connect(self.on_stdout_ready)
+        self.process.readyReadStandardError.connect(self.on_stderr_ready)
+        self.process.finished.connect(self.on_process_finished)
+        self.process.errorOccurred.connect(self.on_process_error)
+
+    def start(self):
+        self.process.start(self.ffmpeg_path, self.args)
+        return self.process.waitForStarted(-1)
+
+    def write(self, data):
+        # frames are written from a blocking capture loop, so wait for each one to reach ffmpeg
+        # instead of letting Qt buffer the whole sequence in memory
+        self.process.write(data)
+        return self.process.waitForBytesWritten(-1)
+
+    def close_write_channel(self):
+        self.process.closeWriteChannel()
+
+    def wait_for_finished(self):
+        self.process.waitForFinished(-1)
+
+    def kill(self):
+        if self.process.state() != QtCore.QProcess.NotRunning:
+            self.process.kill()
+            self.process.waitForFinished(-1)
+
+    def on_stdout_ready(self):
+        self.stdout_buffer += bytes(self.process.readAllStandardOutput())
+        lines = self.stdout_buffer.split(b"\n")
+        self.stdout_buffer = lines.pop()
+
+        for line in lines:
+            key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+            self.progress[key] = value
+
+            # every progress block ends with progress=continue or progress=end
+            if key == "progress":
+                try:
+                    frame = int(self.progress.get("frame", 0))
+                    fps = float(self.progress.get("fps", 0.0))
+                except ValueError:
+                    continue
+
+                self.progress_updated.emit(frame, fps)
+
+    def on_stderr_ready(self):
+        self.stderr_buffer += bytes(self.process.readAllStandardError())
+        lines = self.stderr_buffer.split(b"\n")
+        self.stderr_buffer = lines.pop()
+
+        for line in lines:
+            line = line.decode("utf-8", "replace").rstrip()
+            if line:
+                self.output_logged.emit(line)
+
+    def on_process_finished(self, exit_code, exit_status):
+        if exit_status != QtCore.QProcess.NormalExit:
+            exit_code = -1
+
+        self.emit_finished(exit_code)
+
+    def on_process_error(self, error):
+        # QProcess does not emit finished when the process never started
+        if error == QtCore.QProcess.FailedToStart:
+            self.emit_finished(-1)
+
+    def emit_finished(self, exit_code):
+        if not self.is_finished:
+            self.is_finished = True
+            self.finished.emit(exit_code)
 
 
 class PlayBlast(QtCore.QObject):
     VERSION = "0.0.1"
 
     DEFAULT_FFMPEG_PATH = "C:\\Users\Scott\Downloads\\ffmpeg\\ffmpeg\\bin\\ffmpeg.exe"
+    # log lines batched by the log sink, one emission holds every line since the previous one, newline separated
     output_logged = QtCore.Signal(str)
 
+    # frame, frame count, frames per second, estimated seconds remaining (-1 when unknown)
+    encode_progress = QtCore.Signal(int, int, float, float)
+    # success, output path
+    encode_finished = QtCore.Signal(bool, str)
+
+    # emitted from the segment encode thread and queued back onto the main thread
+    segment_progressed = QtCore.Signal(int, object, int, float)
+    segments_encoded = QtCore.Signal(int, object, str)
+
+    # frames are piped to ffmpeg as raw buffers, or written as an image sequence that ffmpeg reads back
+    CAPTURE_MODE_STREAM = "stream"
+    CAPTURE_MODE_IMAGE_SEQUENCE = "image_sequence"
+    # frames are rendered from a camera with Viewport 2.0 instead of captured from a model panel, so it also runs
+    # in mayapy, which has no panels
+    CAPTURE_MODE_RENDER = "render"
+
+    # defaultRenderGlobals.imageFormat
+    PNG_IMAGE_FORMAT = 32
+
+    DEFAULT_CONTAINER = ".mp4"
+    ENCODE_ARGS = ["-c:v", "libx264", "-preset", "medium", "-crf", "18", "-pix_fmt", "yuv420p"]
+
+    # yuv420p requires even dimensions
+    EVEN_SIZE_FILTER = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+    # renditions encoded together from a single ffmpeg invocation, the first one is the main output
+    RENDITION_PRESETS = {
+        "dailies": [
+            playblast_encode.Rendition("review", "{name}{ext}", ENCODE_ARGS),
+            playblast_encode.Rendition("proxy", "{name}_proxy{ext}",
+                                       ["-c:v", "libx264", "-preset", "fast", "-crf", "23", "-pix_fmt", "yuv420p"],
+                                       scale=0.5),
+            playblast_encode.Rendition("poster", "{name}_poster.png", ["-c:v", "png"], scale=0.5, frame_count=1),
+        ],
+        "dailies_gif": [
+            playblast_encode.Rendition("review", "{name}{ext}", ENCODE_ARGS),
+            playblast_encode.Rendition("proxy", "{name}_proxy{ext}",
+                                       ["-c:v", "libx264", "-preset", "fast", "-crf", "23", "-pix_fmt", "yuv420p"],
+                                       scale=0.5),
+            playblast_encode.GifRendition("gif", "{name}.gif", scale=0.25),
+        ],
+    }
+
+    # output template fields and the methods that query them, frame and version are set by execute
+    TEMPLATE_FIELD_GETTERS = {
+        "project": "get_project_dir_path",
+        "scene": "get_scene_name",
+        "camera": "get_camera_name",
+        "shot": "get_shot_name",
+        "date": "get_date",
+        "user": "get_user_name",
+    }
+
+    # parallel encoding splits image sequences into segments of at least this many frames
+    MIN_SEGMENT_LENGTH = 50
+    SEGMENT_RETRIES = 2
+
     def __init__(self, ffmpeg_path=None, log_to_maya=True):
         super(PlayBlast, self).__init__()
 
         self.log_to_maya = None
+        self.log_sink = playblast_log.LogSink(self.display_in_maya, parent=self)
+        self.log_sink.entries_logged.connect(self.on_entries_logged)
+
         self.ffmpeg_path = None
         self.set_ffmpeg_path(ffmpeg_path)
         self.set_maya_logging_enabled(log_to_maya)
 
+        self.encode_worker_count = None
+        self.set_encode_worker_count(None)
+
+        self.encode_id = 0
+        self.encode_output_path = None
+        self.encode_output_paths = []
+        self.encode_renditions = None
+        self.encode_frame_count = 0
+        self.encode_show_in_viewer = False
+        self.encode_asynchronous = True
+        self.encode_cancelled = False
+        self.encode_temp_dir = None
+        self.encode_process = None
+        self.encode_thread = None
+
+        self.segment_processes = set()
+        self.segment_processes_lock = threading.Lock()
+        self.segment_frame_counts = {}
+
+        # template values queried from the scene, cleared at the start of every execute
+        self.template_values = {}
+        # output directory contents for {version}, kept across executes
+        self.directory_index = playblast_template.DirectoryIndex()
+
+        self.segment_progressed.connect(self.on_segment_progressed)
+        self.segments_encoded.connect(self.on_segments_encoded)
+
     def set_ffmpeg_path(self, ffmpeg_path):
         if ffmpeg_path:
             self.ffmpeg_path = ffmpeg_path
@@ -29,31 +231,73 @@ class PlayBlast(QtCore.QObject):
     def get_ffmpeg_path(self):
         return self.ffmpeg_path
 
+    def set_encode_worker_count(self, worker_count):
+        if worker_count:
+            self.encode_worker_count = worker_count
+        else:
+            self.encode_worker_count = max(1, (os.cpu_count() or 2) // 2)
+
+    def get_encode_worker_count(self):
+        return self.encode_worker_count
+
     def set_maya_logging_enabled(self, enabled):
         self.log_to_maya = enabled
 
+    def set_maya_log_level(self, level):
+        """
+        :param level: lowest playblast_log level shown in the Script Editor, ffmpeg output is logged at DEBUG
+        """
+        self.log_sink.set_display_level(level)
+
+    def set_log_file(self, path):
+        """
+        Appends the full log, ffmpeg output included, to the file at path from a background thread.
+        """
+        self.log_sink.set_log_file(path)
+
     def validate_ffmpeg(self):
         if not self.ffmpeg_path:
             self.log_error("ffmpeg executable path not set")
             return False
         elif not os.path.exists(self.ffmpeg_path):
-            self.log_error("ffmpeg executable path does not exist: {0}".format(self._ffmpeg_path))
+            self.log_error("ffmpeg executable path does not exist: {0}".format(self.ffmpeg_path))
             return False
         elif os.path.isdir(self.ffmpeg_path):
-            self.log_error("Invalid ffmpeg path: {0}".format(self._ffmpeg_path))
+            self.log_error("Invalid ffmpeg path: {0}".format(self.ffmpeg_path))
             return False
 
         return True
 
+    def resolve_output_path(self, dir_path, filename):
+        """
+        Resolves the output directory and filename templates. {version} is one more than the highest version
+        already in the directory it is used in.
+
+        :return: resolved directory path and filename
+        """
+        path_template = playblast_template.get_template("{0}/{1}".format(dir_path, filename))
+        if playblast_template.VERSION_FIELD in path_template.fields and \
+                playblast_template.VERSION_FIELD not in self.template_values:
+            self.template_values[playblast_template.VERSION_FIELD] = playblast_template.get_next_version(
+                path_template, self.get_template_value, self.directory_index)
+
+        return self.resolve_output_directory_path(dir_path), self.resolve_output_filename(filename)
+
     def resolve_output_directory_path(self, dir_path):
-        if "{project}" in dir_path:
-            dir_path = dir_path.replace("{project}", self.get_project_dir_path())
-        return dir_path
+        return playblast_template.get_template(dir_path).render(self.get_template_value)
 
     def resolve_output_filename(self, filename):
-        if "{scene}" in filename:
-            filename = filename.replace("{scene}", self.get_scene_name())
-        return filename
+        return playblast_template.get_template(filename).render(self.get_template_value)
+
+    def get_template_value(self, field_name):
+        if field_name not in self.template_values:
+            getter_name = PlayBlast.TEMPLATE_FIELD_GETTERS.get(field_name)
+            if not getter_name:
+                raise KeyError(field_name)
+
+            self.template_values[field_name] = getattr(self, getter_name)()
+
+        return self.template_values[field_name]
 
     def get_project_dir_path(self):
         return cmds.workspace(q=True, rootDirectory=True)
@@ -67,7 +311,67 @@ class PlayBlast(QtCore.QObject):
 
         return scene_name
 
-    def execute(self, output_dir, filename, padding=4, show_ornaments=True, show_in_viewer=True, overwrite=False):
+    def get_camera_name(self):
+        camera = cmds.modelPanel(self.get_active_model_panel(), q=True, camera=True)
+        return camera.split("|")[-1].replace(":", "_")
+
+    def get_shot_name(self):
+        # the current sequencer shot, or the scene name for scenes without shots
+        shot = cmds.sequenceManager(q=True, currentShot=True)
+        if shot:
+            return cmds.shot(shot, q=True, shotName=True)
+
+        return self.get_scene_name()
+
+    def get_date(self):
+        return time.strftime("%Y%m%d")
+
+    def get_user_name(self):
+        return getpass.getuser()
+
+    def get_frame_rate(self):
+        return mel.eval("currentTimeUnitToFPS()")
+
+    def get_playback_range(self):
+        start_frame = int(cmds.playbackOptions(q=True, minTime=True))
+        end_frame = int(cmds.playbackOptions(q=True, maxTime=True))
+        return start_frame, end_frame
+
+    def get_image_dir_path(self, output_path):
+        return "{0}_frames".format(os.path.splitext(output_path)[0])
+
+    def get_active_model_panel(self):
+        panel = cmds.getPanel(withFocus=True)
+        if not panel or cmds.getPanel(typeOf=panel) != "modelPanel":
+            panel = cmds.playblast(activeEditor=True).split("|")[-1]
+
+        return panel
+
+    def execute(self, output_dir, filename, padding=4, show_ornaments=True, show_in_viewer=True, overwrite=False,
+                frame_range=None, capture_mode=CAPTURE_MODE_STREAM, parallel_encode=False, asynchronous=True,
+                incremental=False, resume=False, renditions=None, camera=None):
+        """
+        Captures the frame range and encodes it. Capture always blocks, but with asynchronous set the encode keeps
+        running after this returns and encode_finished is emitted once it is done.
+
+        With incremental set the frames are kept as an image sequence next to the output and only the frames whose
+        scene state changed since the last incremental playblast are captured again, see incremental_playblast.
+        The output is overwritten.
+
+        With resume set the frames are also kept next to the output, and only frames that do not have a non-empty
+        image yet are captured, so a playblast interrupted by a crash continues where it stopped.
+
+        :param output_dir: directory template, see TEMPLATE_FIELD_GETTERS for the fields. {frame} is the first frame
+                           of the range and {version} one more than the highest version already written.
+        :param filename: filename template, using the same fields as output_dir
+        :param renditions: optional RENDITION_PRESETS name or list of playblast_encode.Rendition, all encoded in one
+                           ffmpeg pass next to the output. The first rendition is the output that is returned.
+        :param camera: camera rendered by CAPTURE_MODE_RENDER, which requires one
+        :return: output path if the encode was started, None otherwise
+        """
+        if self.is_encoding():
+            self.log_error("A playblast is already encoding")
+            return
 
         if not output_dir:
             self.log_error("Output directory path not set")
@@ -77,32 +381,696 @@ class PlayBlast(QtCore.QObject):
             self.log_error("Output file name not set")
             return
 
-        output_dir = self.resolve_output_directory_path(output_dir)
-        filename = self.resolve_output_filename(filename)
+        if capture_mode == PlayBlast.CAPTURE_MODE_RENDER and not camera:
+            self.log_error("Camera not set for a rendered playblast")
+            return
+
+        if not frame_range:
+            frame_range = self.get_playback_range()
+
+        # scene values are queried at most once per execute
+        self.template_values = {"frame": frame_range[0]}
+        if camera:
+            self.template_values["camera"] = camera.split("|")[-1].replace(":", "_")
+        try:
+            output_dir, filename = self.resolve_output_path(output_dir, filename)
+        except ValueError as e:
+            self.log_error(str(e))
+            return
 
         self.log_output("Output dir: {0}".format(output_dir))
         self.log_output("Output filename: {0}".format(filename))
 
-        if self.validate_ffmpeg():
-            self.log_output("TODO: execute playblast")
+        if not self.validate_ffmpeg():
+            return
+
+        if not os.path.splitext(filename)[1]:
+            filename = "{0}{1}".format(filename, PlayBlast.DEFAULT_CONTAINER)
+        output_path = os.path.join(output_dir, filename)
 
-    def log_error(self, text):
-        if self.log_to_maya:
-            om.MGlobal.displayError("[PlayBlast] {0}".format(text))
+        if isinstance(renditions, str):
+            if renditions not in PlayBlast.RENDITION_PRESETS:
+                self.log_error("Invalid rendition preset: {0}".format(renditions))
+                return
+            renditions = PlayBlast.RENDITION_PRESETS[renditions]
 
-        self.output_logged.emit("[ERROR] {0}".format(text))
+        if renditions:
+            output_paths = self.get_rendition_output_paths(output_path, renditions)
+            output_path = output_paths[0]
 
-    def log_warning(self, text):
-        if self.log_to_maya:
-            om.MGlobal.displayWarning("[PlayBlast] {0}".format(text))
+            if parallel_encode:
+                # the segments would have to be encoded once per rendition
+                self.log_warning("Parallel encoding is not supported with renditions, encoding in one pass")
+                parallel_encode = False
+        else:
+            output_paths = [output_path]
+
+        for path in output_paths:
+            if os.path.exists(path) and not (overwrite or incremental or resume):
+                self.log_error("Output file already exists: {0}".format(path))
+                return
+
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        for path in output_paths:
+            self.directory_index.add_path(path)
+
+        self.log_output("Frame range: {0}-{1}".format(frame_range[0], frame_range[1]))
+
+        self.begin_encode(output_paths, renditions, frame_range, show_in_viewer, asynchronous)
+        try:
+            if incremental:
+                self.incremental_playblast(output_path, frame_range, padding, show_ornaments, parallel_encode)
+            elif resume:
+                self.resume_playblast(output_path, frame_range, padding, show_ornaments, parallel_encode)
+            elif capture_mode == PlayBlast.CAPTURE_MODE_STREAM:
+                self.stream_playblast(output_path, frame_range, show_ornaments)
+            elif capture_mode == PlayBlast.CAPTURE_MODE_IMAGE_SEQUENCE:
+                self.image_sequence_playblast(output_path, frame_range, padding, show_ornaments, parallel_encode)
+            elif capture_mode == PlayBlast.CAPTURE_MODE_RENDER:
+                self.render_playblast(output_path, frame_range, padding, camera, parallel_encode)
+            else:
+                raise RuntimeError("Invalid capture mode: {0}".format(capture_mode))
+        except:
+            traceback.print_exc()
+            self.log_error("Playblast failed. See script editor for details.")
+            self.finish_encode(False)
+            return
+
+        if not asynchronous:
+            self.wait_for_encode()
+
+        return output_path
+
+    def get_rendition_output_paths(self, output_path, renditions):
+        name, ext = os.path.splitext(os.path.basename(output_path))
+        output_dir = os.path.dirname(output_path)
+
+        return [os.path.join(output_dir, playblast_template.get_template(rendition.filename).render(
+            {"name": name, "ext": ext})) for rendition in renditions]
+
+    def begin_encode(self, output_paths, renditions, frame_range, show_in_viewer, asynchronous):
+        self.encode_id += 1
+        self.encode_output_path = output_paths[0]
+        self.encode_output_paths = output_paths
+        self.encode_renditions = renditions
+        self.encode_frame_count = frame_range[1] - frame_range[0] + 1
+        self.encode_show_in_viewer = show_in_viewer
+        self.encode_asynchronous = asynchronous
+        self.encode_cancelled = False
+        self.encode_temp_dir = None
+        self.encode_process = None
+        self.encode_thread = None
+        self.segment_frame_counts = {}
+
+    def finish_encode(self, success):
+        if not self.is_encoding():
+            return
+
+        output_path = self.encode_output_path
+        output_paths = self.encode_output_paths
+        self.encode_output_path = None
+        self.encode_process = None
+        self.encode_thread = None
+
+        if self.encode_temp_dir:
+            self.log_segment_logs(self.encode_temp_dir)
+            shutil.rmtree(self.encode_temp_dir, ignore_errors=True)
+            self.encode_temp_dir = None
+
+        if success:
+            self.log_output("Playblast complete: {0}".format(output_path))
+            for path in output_paths[1:]:
+                self.log_output("Rendition written: {0}".format(path))
+            if self.encode_show_in_viewer:
+                self.open_in_viewer(output_path)
+        else:
+            # never leave a partial movie behind
+            for path in output_paths:
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        self.log_warning("Failed to remove partial output: {0}".format(path))
+
+            if self.encode_cancelled:
+                self.log_warning("Playblast cancelled")
+
+        self.log_sink.flush()
+        self.encode_finished.emit(success, output_path)
+
+    def log_segment_logs(self, segment_dir):
+        """
+        Copies what ffmpeg reported for each segment into the playblast log, before the segment directory is removed.
+        The segments are encoded with -loglevel error, so only failed attempts leave anything behind.
+        """
+        for name in sorted(os.listdir(segment_dir)):
+            if not name.endswith(".log"):
+                continue
+
+            with open(os.path.join(segment_dir, name), "r", errors="replace") as log_file:
+                lines = log_file.read().splitlines()
+
+            if lines:
+                self.log_warning("Segment log {0}:".format(name))
+                for line in lines:
+                    self.log_output(line)
+
+    def is_encoding(self):
+        return self.encode_output_path is not None
+
+    def wait_for_encode(self):
+        """
+        Blocks until the current encode has finished.
+        """
+        while self.is_encoding():
+            if self.encode_process:
+                self.encode_process.wait_for_finished()
+            elif self.encode_thread:
+                encode_thread = self.encode_thread
+                encode_thread.join()
+                # delivers the queued segment signals
+                QtCore.QCoreApplication.processEvents()
+                if self.encode_thread is encode_thread:
+                    break
+            else:
+                break
+
+    def cancel(self):
+        """
+        Kills the running encode, removing its partial output.
+        """
+        if not self.is_encoding():
+            return
+
+        self.encode_cancelled = True
+
+        with self.segment_processes_lock:
+            for process in self.segment_processes:
+                process.kill()
+
+        if self.encode_thread:
+            self.encode_thread.join()
+
+        if self.encode_process:
+            self.encode_process.kill()
+
+        self.finish_encode(False)
+
+    def stream_playblast(self, output_path, frame_range, show_ornaments):
+        """
+        Captures each frame from the active viewport and pipes the raw RGBA buffer straight into ffmpeg,
+        so no image sequence is written to disk and encoding overlaps capture.
+        """
+        model_panel = self.get_active_model_panel()
+        orig_show_hud = cmds.modelEditor(model_panel, q=True, hud=True)
+        orig_time = cmds.currentTime(q=True)
+
+        view = omui2.M3dView.getM3dViewFromModelPanel(model_panel)
+
+        ffmpeg_process = None
+        try:
+            cmds.modelEditor(model_panel, e=True, hud=show_ornaments)
+
+            for frame in range(frame_range[0], frame_range[1] + 1):
+                cmds.currentTime(frame, update=True)
+                width, height, pixels = self.capture_view(view)
+
+                if not ffmpeg_process:
+                    ffmpeg_process = self.start_stream_encode(output_path, width, height)
+                    frame_size = (width, height)
+                elif (width, height) != frame_size:
+                    raise RuntimeError("Viewport size changed during playblast")
+
+                if not ffmpeg_process.write(pixels):
+                    raise RuntimeError("ffmpeg stopped accepting frames")
+        except:
+            if ffmpeg_process:
+                ffmpeg_process.kill()
+            raise
+        finally:
+            cmds.modelEditor(model_panel, e=True, hud=orig_show_hud)
+            cmds.currentTime(orig_time, update=True)
 
-        self.output_logged.emit("[WARNING] {0}".format(text))
+        if not ffmpeg_process:
+            raise RuntimeError("No frames captured")
+
+        ffmpeg_process.close_write_channel()
+
+    def capture_view(self, view):
+        view.refresh(False, True)
+
+        image = om2.MImage()
+        view.readColorBuffer(image, True)
+        width, height = image.getSize()
+
+        return width, height, ctypes.string_at(image.pixels(), width * height * 4)
+
+    def start_stream_encode(self, output_path, width, height):
+        args = ["-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "{0}x{1}".format(width, height),
+                "-framerate", str(self.get_frame_rate()), "-i", "-"]
+        # the color buffer is read bottom row first
+        args.extend(self.get_output_args(output_path, "vflip"))
+
+        self.log_output("Streaming to ffmpeg: {0}".format(" ".join(args)))
+        return self.start_ffmpeg(args)
+
+    def image_sequence_playblast(self, output_path, frame_range, padding, show_ornaments, parallel_encode=False):
+        """
+        Fallback that playblasts an image sequence to a temporary directory and then encodes it,
+        optionally in parallel segments. The directory is removed once the encode finishes.
+        """
+        self.encode_temp_dir = tempfile.mkdtemp(prefix="playblast_")
+
+        image_name = os.path.splitext(os.path.basename(output_path))[0]
+        cmds.playblast(filename=os.path.join(self.encode_temp_dir, image_name), format="image", compression="png",
+                       startTime=frame_range[0], endTime=frame_range[1], framePadding=padding, percent=100,
+                       showOrnaments=show_ornaments, forceOverwrite=True, offScreen=True, viewer=False)
+
+        input_pattern = os.path.join(self.encode_temp_dir, "{0}.%0{1}d.png".format(image_name, padding))
+        if parallel_encode:
+            self.encode_image_sequence_parallel(input_pattern, frame_range, output_path, self.encode_temp_dir)
+        else:
+            self.encode_image_sequence(input_pattern, frame_range[0], output_path)
+
+    def render_playblast(self, output_path, frame_range, padding, camera, parallel_encode=False):
+        """
+        Renders every frame from the camera with ogsRender to a temporary directory and then encodes it, optionally
+        in parallel segments. Unlike cmds.playblast it does not need a model panel. The frames use the render
+        resolution and never show ornaments.
+        """
+        self.encode_temp_dir = tempfile.mkdtemp(prefix="playblast_")
+        image_name = os.path.splitext(os.path.basename(output_path))[0]
+
+        orig_time = cmds.currentTime(q=True)
+        orig_image_format = cmds.getAttr("defaultRenderGlobals.imageFormat")
+        try:
+            cmds.setAttr("defaultRenderGlobals.imageFormat", PlayBlast.PNG_IMAGE_FORMAT)
+
+            for frame in range(frame_range[0], frame_range[1] + 1):
+                cmds.currentTime(frame)
+                rendered_path = cmds.ogsRender(camera=camera, currentFrame=True)
+                if not rendered_path or not os.path.exists(rendered_path):
+                    raise RuntimeError("Failed to render frame {0} from {1}".format(frame, camera))
+
+                # moved, since the render output directory may be on another drive
+                shutil.move(rendered_path, os.path.join(self.encode_temp_dir, "{0}.{1}.png".format(
+                    image_name, str(frame).zfill(padding))))
+        finally:
+            cmds.setAttr("defaultRenderGlobals.imageFormat", orig_image_format)
+            cmds.currentTime(orig_time)
+
+        input_pattern = os.path.join(self.encode_temp_dir, "{0}.%0{1}d.png".format(image_name, padding))
+        if parallel_encode:
+            self.encode_image_sequence_parallel(input_pattern, frame_range, output_path, self.encode_temp_dir)
+        else:
+            self.encode_image_sequence(input_pattern, frame_range[0], output_path)
+
+    def incremental_playblast(self, output_path, frame_range, padding, show_ornaments, parallel_encode=False):
+        """
+        Keeps the captured frames in a directory next to the output with a cache manifest mapping each frame to a
+        hash of the scene state it was captured from: the value of every animated curve that can change what the
+        camera sees, see get_visible_time_curve_fns, and the camera world matrix and focal length at that frame.
+        Only frames whose hash changed or whose image is missing are captured, over the existing images, before
+        the whole sequence is encoded.
+
+        Changing the camera, the viewport size, the padding, the ornaments, any driven key or the value of any
+        static curve re-captures every frame. Edits that are not keyed, such as modeling changes, are not detected.
+        """
+        image_dir = self.get_image_dir_path(output_path)
+        image_name = os.path.splitext(os.path.basename(output_path))[0]
+
+        model_panel = self.get_active_model_panel()
+        camera = cmds.modelPanel(model_panel, q=True, camera=True)
+        view = omui2.M3dView.getM3dViewFromModelPanel(model_panel)
+
+        camera_path = self.get_camera_shape_path(camera)
+        static_curve_fns, animated_curve_fns = self.get_visible_time_curve_fns(camera_path)
+
+        # a static curve has the same value on every frame, so it is hashed once instead of per frame
+        static_values = [curve_fn.evaluate(om2.MTime(frame_range[0], om2.MTime.uiUnit()))
+                         for curve_fn in static_curve_fns]
+
+        settings = {"camera": camera,
+                    "size": [view.portWidth(), view.portHeight()],
+                    "padding": padding,
+                    "show_ornaments": show_ornaments,
+                    "driven_keys": self.get_driven_keys_hash(),
+                    "static_curves": playblast_cache.hash_values(static_values)}
+        cache = playblast_cache.FrameCache.load(os.path.join(image_dir, "cache.json"), settings)
+
+        frame_hashes = self.get_frame_hashes(frame_range, camera_path, animated_curve_fns)
+        captured_frames = playblast_cache.scan_captured_frames(image_dir, image_name, padding, frame_hashes)
+
+        dirty_frames = cache.get_dirty_frames(frame_hashes, captured_frames.__contains__)
+        self.log_output("Capturing {0} of {1} frames".format(len(dirty_frames), len(frame_hashes)))
+
+        if dirty_frames:
+            self.capture_frames(image_dir, image_name, dirty_frames, padding, show_ornaments)
+
+            # only saved once the capture succeeded, so an interrupted capture is redone next time
+            cache.update(dict((frame, frame_hashes[frame]) for frame in dirty_frames))
+            cache.save()
+
+        self.encode_image_dir(image_dir, image_name, frame_range, padding, output_path, parallel_encode)
+
+    def resume_playblast(self, output_path, frame_range, padding, show_ornaments, parallel_encode=False):
+        """
+        Keeps the captured frames in a directory next to the output and only captures the frames that are missing or
+        empty there, before the whole sequence is encoded.
+        """
+        image_dir = self.get_image_dir_path(output_path)
+        image_name = os.path.splitext(os.path.basename(output_path))[0]
+
+        frames = range(frame_range[0], frame_range[1] + 1)
+        captured_frames = playblast_cache.scan_captured_frames(image_dir, image_name, padding, frames)
+
+        missing_frames = [frame for frame in frames if frame not in captured_frames]
+        if captured_frames:
+            self.log_output("Resuming playblast: {0} of {1} frames already captured".format(
+                len(frames) - len(missing_frames), len(frames)))
+
+        if missing_frames:
+            self.capture_frames(image_dir, image_name, missing_frames, padding, show_ornaments)
+
+        self.encode_image_dir(image_dir, image_name, frame_range, padding, output_path, parallel_encode)
+
+    def capture_frames(self, image_dir, image_name, frames, padding, show_ornaments):
+        # each image is written as soon as it is captured, so frames captured before a crash are kept
+        cmds.playblast(filename=os.path.join(image_dir, image_name), format="image", compression="png",
+                       frame=frames, framePadding=padding, percent=100, showOrnaments=show_ornaments,
+                       forceOverwrite=True, offScreen=True, viewer=False)
+
+    def encode_image_dir(self, image_dir, image_name, frame_range, padding, output_path, parallel_encode):
+        input_pattern = os.path.join(image_dir, "{0}.%0{1}d.png".format(image_name, padding))
+        if parallel_encode:
+            self.encode_temp_dir = tempfile.mkdtemp(prefix="playblast_")
+            self.encode_image_sequence_parallel(input_pattern, frame_range, output_path, self.encode_temp_dir)
+        else:
+            self.encode_image_sequence(input_pattern, frame_range[0], output_path)
+
+    def get_anim_curve_fns_by_input(self):
+        """
+        :return: MFnAnimCurve for every anim curve driven by time, and every other (driven key) anim curve
+        """
+        time_curve_fns = []
+        driven_curve_fns = []
+
+        it = om2.MItDependencyNodes(om2.MFn.kAnimCurve)
+        while not it.isDone():
+            curve_fn = oma2.MFnAnimCurve(it.thisNode())
+            if curve_fn.isTimeInput:
+                time_curve_fns.append(curve_fn)
+            else:
+                driven_curve_fns.append(curve_fn)
+
+            it.next()
+
+        return time_curve_fns, driven_curve_fns
+
+    def get_driven_keys_hash(self):
+        values = []
+        for curve_fn in self.get_anim_curve_fns_by_input()[1]:
+            for i in range(curve_fn.numKeys):
+                values.append(curve_fn.unitlessInput(i))
+                values.append(curve_fn.value(i))
+
+        return playblast_cache.hash_values(values)
+
+    def get_camera_shape_path(self, camera):
+        selection_list = om2.MSelectionList()
+        selection_list.add(camera)
+
+        camera_path = selection_list.getDagPath(0)
+        camera_path.extendToShape()
+
+        return camera_path
+
+    def get_visible_time_curve_fns(self, camera_path):
+        """
+        Finds the time driven curves that can change what the camera sees: curves driving the camera, one of its
+        parents, a visibility attribute, a DAG node that is visible or whose visibility is animated, or a node that
+        is not a DAG node, such as a deformer or a shader.
+
+        :return: (static, animated) lists of MFnAnimCurve, static curves have the same value on every frame
+        """
+        camera_paths = set()
+        path = om2.MDagPath(camera_path)
+        while path.length() > 0:
+            camera_paths.add(path.fullPathName())
+            path.pop()
+
+        hidden_paths = {}
+
+        def is_hidden(node):
+            dag_path = om2.MDagPath.getAPathTo(node)
+            path_name = dag_path.fullPathName()
+            if path_name not in hidden_paths:
+                hidden_paths[path_name] = path_name not in camera_paths and self.is_dag_path_hidden(dag_path)
+
+            return hidden_paths[path_name]
+
+        static_curve_fns = []
+        animated_curve_fns = []
+        for curve_fn in self.get_anim_curve_fns_by_input()[0]:
+            for plug in curve_fn.findPlug("output", False).destinations():
+                node = plug.node()
+                if not node.hasFn(om2.MFn.kDagNode) or plug.partialName(useLongNames=True) == "visibility" or \
+                        not is_hidden(node):
+                    if curve_fn.isStatic:
+                        static_curve_fns.append(curve_fn)
+                    else:
+                        animated_curve_fns.append(curve_fn)
+                    break
+
+        return static_curve_fns, animated_curve_fns
+
+    def is_dag_path_hidden(self, dag_path):
+        """
+        :return: whether the node is hidden on every frame: it or a parent is hidden and none of their visibility
+                 is driven
+        """
+        if dag_path.isVisible():
+            return False
+
+        path = om2.MDagPath(dag_path)
+        while path.length() > 0:
+            if om2.MFnDagNode(path).findPlug("visibility", False).isDestination:
+                return False
+            path.pop()
+
+        return True
+
+    def get_frame_hashes(self, frame_range, camera_path, curve_fns):
+        """
+        :param camera_path: MDagPath of the camera shape
+        :param curve_fns: MFnAnimCurve of every animated curve to hash
+        :return: dict of frame to a hash of the scene state captured at that frame
+        """
+        time_unit = om2.MTime.uiUnit()
+
+        # read through the API at each frame, which picks up constraints and expressions on the camera that are not
+        # keyed directly without a getAttr command per frame
+        camera_fn = om2.MFnDagNode(camera_path)
+        world_matrix_plug = camera_fn.findPlug("worldMatrix", False).elementByLogicalIndex(camera_path.instanceNumber())
+        focal_length_plug = camera_fn.findPlug("focalLength", False)
+
+        frame_hashes = {}
+        for frame in range(frame_range[0], frame_range[1] + 1):
+            frame_time = om2.MTime(frame, time_unit)
+            context = om2.MDGContext(frame_time)
+
+            values = [curve_fn.evaluate(frame_time) for curve_fn in curve_fns]
+            values.extend(om2.MFnMatrixData(world_matrix_plug.asMObject(context)).matrix())
+            values.append(focal_length_plug.asDouble(context))
+
+            frame_hashes[frame] = playblast_cache.hash_values(values)
+
+        return frame_hashes
+
+    def get_output_args(self, output_path, input_filter=None):
+        """
+        :return: ffmpeg args encoding the input to output_path, or to every rendition in one pass if there are any
+        """
+        if self.encode_renditions:
+            return playblast_encode.get_rendition_args(self.encode_renditions, self.encode_output_paths, input_filter)
+
+        args = ["-vf", ",".join(f for f in [input_filter, PlayBlast.EVEN_SIZE_FILTER] if f)]
+        args.extend(PlayBlast.ENCODE_ARGS)
+        args.append(output_path)
+
+        return args
+
+    def encode_image_sequence(self, input_pattern, start_frame, output_path):
+        args = ["-y", "-loglevel", "error",
+                "-framerate", str(self.get_frame_rate()), "-start_number", str(start_frame), "-i", input_pattern]
+        args.extend(self.get_output_args(output_path))
+
+        self.log_output("Encoding image sequence: {0}".format(" ".join(args)))
+        self.start_ffmpeg(args)
+
+    def encode_image_sequence_parallel(self, input_pattern, frame_range, output_path, segment_dir):
+        """
+        Encodes the image sequence in segments across a pool of ffmpeg processes,
+        then joins the segments with the concat demuxer without re-encoding.
+        """
+        extension = os.path.splitext(output_path)[1]
+        segments = playblast_encode.create_segments(frame_range[0], frame_range[1], self.encode_worker_count,
+                                                    segment_dir, extension, PlayBlast.MIN_SEGMENT_LENGTH)
+
+        self.log_output("Encoding {0} segments with {1} workers".format(len(segments), self.encode_worker_count))
+
+        # queried here because the segments are encoded off the main thread
+        frame_rate = self.get_frame_rate()
+        encode_id = self.encode_id
+        start_time = time.time()
+
+        def encode_segment(segment):
+            return self.encode_image_sequence_segment(input_pattern, frame_rate, segment)
+
+        def on_progress(segment, completed_count, segment_count):
+            self.segment_progressed.emit(encode_id, segment, completed_count, time.time() - start_time)
+
+        def encode():
+            try:
+                playblast_encode.encode_segments(segments, encode_segment, self.encode_worker_count,
+                                                 PlayBlast.SEGMENT_RETRIES, on_progress)
+            except playblast_encode.SegmentEncodeError as e:
+                self.segments_encoded.emit(encode_id, segments, str(e))
+                return
+
+            self.segments_encoded.emit(encode_id, segments, "")
+
+        if self.encode_asynchronous:
+            # the segment signals are queued back onto the main thread, where logging to Maya is safe
+            self.encode_thread = threading.Thread(target=encode)
+            self.encode_thread.daemon = True
+            self.encode_thread.start()
+        else:
+            encode()
+
+    def on_segment_progressed(self, encode_id, segment, completed_count, elapsed_time):
+        if encode_id != self.encode_id or not self.is_encoding():
+            return
+
+        if segment.return_code == 0:
+            self.log_output("{0} encoded ({1} segments done)".format(segment, completed_count))
+            self.segment_frame_counts[segment.index] = segment.frame_count()
+
+            encoded_frame_count = sum(self.segment_frame_counts.values())
+            fps = encoded_frame_count / max(elapsed_time, 0.001)
+            self.emit_encode_progress(encoded_frame_count, fps)
+        elif not self.encode_cancelled:
+            # the segment log is copied into the playblast log once the encode finishes
+            self.log_warning("{0} failed with exit code {1}".format(segment, segment.return_code))
+
+    def on_segments_encoded(self, encode_id, segments, error):
+        if encode_id != self.encode_id or not self.is_encoding():
+            return
+
+        self.encode_thread = None
+        if error:
+            self.log_error(error)
+            self.finish_encode(False)
+            return
+
+        list_path = playblast_encode.write_concat_list(segments, os.path.join(self.encode_temp_dir, "segments.txt"))
+
+        args = ["-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy",
+                self.encode_output_path]
+        self.log_output("Joining segments: {0}".format(" ".join(args)))
+        self.start_ffmpeg(args)
+
+    def encode_image_sequence_segment(self, input_pattern, frame_rate, segment):
+        # called from the encode pool, so it only writes to the segment log and never logs to Maya
+        if self.encode_cancelled:
+            return -1
+
+        args = [self.ffmpeg_path, "-y", "-loglevel", "error",
+                "-framerate", str(frame_rate), "-start_number", str(segment.start_frame), "-i", input_pattern,
+                "-frames:v", str(segment.frame_count()), "-vf", PlayBlast.EVEN_SIZE_FILTER]
+        args.extend(PlayBlast.ENCODE_ARGS)
+        args.append(segment.output_path)
+
+        with open(segment.get_log_path(), "w") as log_file:
+            process = subprocess.Popen(args, stdout=log_file, stderr=subprocess.STDOUT)
+            with self.segment_processes_lock:
+                self.segment_processes.add(process)
+            try:
+                return process.wait()
+            finally:
+                with self.segment_processes_lock:
+                    self.segment_processes.discard(process)
+
+    def start_ffmpeg(self, args):
+        """
+        Starts ffmpeg as the current encode process. The encode finishes when the process does.
+        """
+        process = FfmpegProcess(self.ffmpeg_path, args, self)
+        # ffmpeg runs with -loglevel error, so anything it writes to stderr explains a failure
+        process.output_logged.connect(self.log_warning)
+        process.progress_updated.connect(self.emit_encode_progress)
+        process.finished.connect(self.on_encode_process_finished)
+
+        self.encode_process = process
+        if not process.start():
+            raise RuntimeError("Failed to start ffmpeg: {0}".format(self.ffmpeg_path))
+
+        return process
+
+    def on_encode_process_finished(self, exit_code):
+        if self.sender() is not self.encode_process:
+            return
+
+        if exit_code != 0 and not self.encode_cancelled:
+            self.log_error("ffmpeg failed with exit code {0}".format(exit_code))
+
+        self.finish_encode(exit_code == 0 and not self.encode_cancelled)
+
+    def emit_encode_progress(self, frame, fps):
+        frame_count = self.encode_frame_count
+        eta = (frame_count - frame) / fps if fps > 0 else -1.0
+
+        self.encode_progress.emit(frame, frame_count, fps, eta)
+        self.log_debug("Encoded frame {0}/{1} ({2:.1f} fps, ETA {3})".format(
+            frame, frame_count, fps, "{0:.0f}s".format(eta) if eta >= 0 else "unknown"))
+
+    def open_in_viewer(self, path):
+        if sys.platform == "win32":
+            os.startfile(path)
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", path])
+        else:
+            subprocess.Popen(["xdg-open", path])
+
+    def log_error(self, text):
+        self.log_sink.log(playblast_log.ERROR, text)
+        # errors are not held back until the next batch
+        self.log_sink.flush()
+
+    def log_warning(self, text):
+        self.log_sink.log(playblast_log.WARNING, text)
 
     def log_output(self, text):
-        if self.log_to_maya:
+        self.log_sink.log(playblast_log.INFO, text)
+
+    def log_debug(self, text):
+        self.log_sink.log(playblast_log.DEBUG, text)
+
+    def display_in_maya(self, level, text):
+        if not self.log_to_maya:
+            return
+
+        if level >= playblast_log.ERROR:
+            om.MGlobal.displayError("[PlayBlast] {0}".format(text))
+        elif level >= playblast_log.WARNING:
+            om.MGlobal.displayWarning("[PlayBlast] {0}".format(text))
+        else:
             om.MGlobal.displayInfo(text)
 
-        self.output_logged.emit(text)
+    def on_entries_logged(self, entries):
+        self.output_logged.emit("\n".join(playblast_log.LogSink.format_entry(entry) for entry in entries))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+import array
+import hashlib
+import json
+import os
+
+
+class FrameCache(object):
+    """
+    Maps each captured frame to the hash of the scene state it was captured from. A change to the capture
+    settings invalidates every frame.
+    """
+
+    VERSION = 1
+
+    def __init__(self, manifest_path, settings):
+        """
+        :param settings: JSON serializable capture settings, e.g. camera, resolution and padding
+        """
+        self.manifest_path = manifest_path
+        self.settings = settings
+        self.frame_hashes = {}
+
+    def __len__(self):
+        return len(self.frame_hashes)
+
+    def get_dirty_frames(self, frame_hashes, is_frame_captured):
+        """
+        :param frame_hashes: dict of frame to the hash of its current scene state
+        :param is_frame_captured: callable taking a frame and returning whether its image exists
+        :return: sorted list of the frames that need capturing
+        """
+        dirty_frames = []
+        for frame in sorted(frame_hashes):
+            if self.frame_hashes.get(frame) != frame_hashes[frame] or not is_frame_captured(frame):
+                dirty_frames.append(frame)
+
+        return dirty_frames
+
+    def update(self, frame_hashes):
+        self.frame_hashes.update(frame_hashes)
+
+    def invalidate(self):
+        self.frame_hashes = {}
+
+    def save(self):
+        manifest = {"version": FrameCache.VERSION,
+                    "settings": self.settings,
+                    "frames": dict((str(frame), frame_hash) for frame, frame_hash in self.frame_hashes.items())}
+
+        save_json(self.manifest_path, manifest, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, manifest_path, settings):
+        """
+        Loads the manifest at manifest_path. The cache is empty if there is no manifest, it cannot be read or it was
+        captured with different settings.
+        """
+        cache = FrameCache(manifest_path, settings)
+        if not os.path.exists(manifest_path):
+            return cache
+
+        try:
+            with open(manifest_path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+        except ValueError:
+            return cache
+
+        # settings are compared after a JSON round trip, so tuples and lists match
+        if manifest.get("version") != FrameCache.VERSION or \
+                manifest.get("settings") != json.loads(json.dumps(settings)):
+            return cache
+
+        cache.frame_hashes = dict((int(frame), frame_hash) for frame, frame_hash in manifest["frames"].items())
+        return cache
+
+
+def save_json(path, data, **kwargs):
+    """
+    Writes data as JSON next to path and swaps it in, so an interrupted save never leaves a truncated file.
+
+    :param kwargs: passed to json.dump
+    """
+    dir_path = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(dir_path):
+        os.makedirs(dir_path)
+
+    temp_path = "{0}.tmp".format(path)
+    with open(temp_path, "w") as json_file:
+        json.dump(data, json_file, **kwargs)
+    os.replace(temp_path, path)
+
+
+def hash_values(values):
+    """
+    :param values: sequence of floats
+    :return: hex digest of the values
+    """
+    return hashlib.sha1(array.array("d", values).tobytes()).hexdigest()
+
+
+def scan_captured_frames(image_dir, image_name, padding, frames):
+    """
+    Finds the frames of an image sequence that are already on disk with a single directory scan, so it stays fast
+    with tens of thousands of files in the directory. Empty images, such as those left by a crash, do not count.
+
+    :param frames: frames to look for
+    :return: set of the frames that have a non-empty image
+    """
+    if not os.path.isdir(image_dir):
+        return set()
+
+    frames = set(frames)
+    prefix = "{0}.".format(image_name)
+    suffix = ".png"
+
+    captured_frames = set()
+    for entry in os.scandir(image_dir):
+        name = entry.name
+        if not name.startswith(prefix) or not name.endswith(suffix):
+            continue
+
+        frame_text = name[len(prefix):-len(suffix)]
+        if not frame_text.lstrip("-").isdigit():
+            continue
+
+        # images written with a different padding belong to another sequence
+        frame = int(frame_text)
+        if frame_text != str(frame).zfill(padding):
+            continue
+
+        # only the matching files are stat'd
+        if frame in frames and entry.is_file() and entry.stat().st_size > 0:
+            captured_frames.add(frame)
+
+    return captured_frames
@@ -0,0 +1,295 @@
+import argparse
+import concurrent.futures
+import os
+import shutil
+import sys
+import tempfile
+
+
+class EncodeSegment(object):
+
+    def __init__(self, index, start_frame, end_frame, output_path):
+        self.index = index
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.output_path = output_path
+
+        self.attempts = 0
+        self.return_code = None
+
+    def __str__(self):
+        return "Segment {0} ({1}-{2})".format(self.index, self.start_frame, self.end_frame)
+
+    def frame_count(self):
+        return self.end_frame - self.start_frame + 1
+
+    def get_log_path(self):
+        # one log per attempt, so a retry never overwrites the log of the attempt that failed
+        return "{0}.{1}.log".format(os.path.splitext(self.output_path)[0], self.attempts)
+
+
+class SegmentEncodeError(RuntimeError):
+    pass
+
+
+def split_frame_range(start_frame, end_frame, segment_count, min_segment_length=1):
+    """
+    Splits an inclusive frame range into up to segment_count contiguous (start, end) ranges of near equal length.
+    """
+    frame_count = end_frame - start_frame + 1
+    if frame_count < 1:
+        return []
+
+    segment_count = max(1, min(segment_count, frame_count // max(1, min_segment_length)))
+
+    segment_ranges = []
+    segment_start = start_frame
+    for i in range(segment_count):
+        segment_length = frame_count // segment_count + (1 if i < frame_count % segment_count else 0)
+        segment_ranges.append((segment_start, segment_start + segment_length - 1))
+        segment_start += segment_length
+
+    return segment_ranges
+
+
+def create_segments(start_frame, end_frame, segment_count, segment_dir, extension, min_segment_length=1):
+    segments = []
+    for index, (segment_start, segment_end) in enumerate(split_frame_range(start_frame, end_frame, segment_count,
+                                                                            min_segment_length)):
+        output_path = os.path.join(segment_dir, "segment_{0:03d}{1}".format(index, extension))
+        segments.append(EncodeSegment(index, segment_start, segment_end, output_path))
+
+    return segments
+
+
+def encode_segments(segments, encode_segment, max_workers, max_retries=2, on_progress=None):
+    """
+    Encodes every segment across a pool of max_workers, retrying failed segments up to max_retries times.
+    The progress callback is only called from the calling thread.
+
+    :param encode_segment: callable taking an EncodeSegment and returning an exit code, 0 on success
+    :param on_progress: optional callable taking (segment, completed_count, segment_count)
+    :raises SegmentEncodeError: when a segment still fails after all of its retries
+    """
+    completed_count = 0
+
+    def run_segment(segment):
+        try:
+            return segment, encode_segment(segment)
+        except Exception:
+            return segment, -1
+
+    def submit(segment):
+        segment.attempts += 1
+        return executor.submit(run_segment, segment)
+
+    # each segment is its own process, threads only wait on them
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = set(submit(segment) for segment in segments)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                segment, return_code = future.result()
+                segment.return_code = return_code
+                if segment.return_code == 0:
+                    completed_count += 1
+                elif segment.attempts <= max_retries:
+                    pending.add(submit(segment))
+                else:
+                    for pending_future in pending:
+                        pending_future.cancel()
+                    raise SegmentEncodeError("{0} failed after {1} attempts with exit code {2}".format(
+                        segment, segment.attempts, segment.return_code))
+
+                if on_progress:
+                    on_progress(segment, completed_count, len(segments))
+
+
+def write_concat_list(segments, list_path):
+    """
+    Writes the file list read by ffmpeg's concat demuxer (-f concat -safe 0 -i list_path -c copy).
+    """
+    with open(list_path, "w") as list_file:
+        for segment in sorted(segments, key=lambda s: s.index):
+            escaped_path = os.path.abspath(segment.output_path).replace("\\", "/").replace("'", "'\\''")
+            list_file.write("file '{0}'\n".format(escaped_path))
+
+    return list_path
+
+
+def read_concat_list(list_path):
+    """
+    :return: the paths listed by write_concat_list, in order
+    """
+    paths = []
+    with open(list_path, "r") as list_file:
+        for line in list_file:
+            line = line.strip()
+            if line.startswith("file '") and line.endswith("'"):
+                paths.append(line[len("file '"):-1].replace("'\\''", "'"))
+
+    return paths
+
+
+class Rendition(object):
+    """
+    One output of a multi-rendition encode, scaled from the captured frames and encoded with its own codec.
+    """
+
+    def __init__(self, name, filename, codec_args, scale=1.0, frame_count=None):
+        """
+        :param filename: filename template, {name} is the output name without extension and {ext} its extension
+        :param codec_args: ffmpeg output args, such as the codec and its quality settings
+        :param scale: size relative to the captured frames
+        :param frame_count: optional number of frames to encode, e.g. 1 for a poster frame
+        """
+        self.name = name
+        self.filename = filename
+        self.codec_args = codec_args
+        self.scale = scale
+        self.frame_count = frame_count
+
+    def __str__(self):
+        return self.name
+
+    def get_scale_filter(self):
+        # rounded down to even sizes, which most codecs require
+        if self.scale == 1.0:
+            return "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+        return "scale=trunc(iw*{0}/2)*2:trunc(ih*{0}/2)*2".format(self.scale)
+
+    def get_filter_graph(self, input_label, output_label):
+        return "[{0}]{1}[{2}]".format(input_label, self.get_scale_filter(), output_label)
+
+    def get_output_args(self):
+        args = list(self.codec_args)
+        if self.frame_count:
+            args.extend(["-frames:v", str(self.frame_count)])
+
+        return args
+
+
+class GifRendition(Rendition):
+    """
+    Animated GIF using a palette generated from the frames, instead of the default GIF palette.
+    """
+
+    def __init__(self, name, filename, scale=0.5, fps=10):
+        super(GifRendition, self).__init__(name, filename, [], scale)
+
+        self.fps = fps
+
+    def get_filter_graph(self, input_label, output_label):
+        return ("[{0}]fps={1},{2},split[{3}_frames][{3}_palette_frames];"
+                "[{3}_palette_frames]palettegen[{3}_palette];"
+                "[{3}_frames][{3}_palette]paletteuse[{3}]").format(input_label, self.fps, self.get_scale_filter(),
+                                                                   output_label)
+
+
+def get_rendition_args(renditions, output_paths, input_filter=None):
+    """
+    Builds the ffmpeg output args that encode every rendition in one invocation: the input is decoded once,
+    split and scaled per rendition in a single filter graph, and each output is mapped to its own codec.
+
+    :param output_paths: output path for every rendition
+    :param input_filter: optional filter applied once before the split, such as vflip
+    """
+    filter_graph = ["[0:v]{0}split={1}{2}".format("{0},".format(input_filter) if input_filter else "",
+                                                  len(renditions),
+                                                  "".join("[split{0}]".format(i) for i in range(len(renditions))))]
+
+    for i, rendition in enumerate(renditions):
+        filter_graph.append(rendition.get_filter_graph("split{0}".format(i), "out{0}".format(i)))
+
+    args = ["-filter_complex", ";".join(filter_graph)]
+    for i, (rendition, output_path) in enumerate(zip(renditions, output_paths)):
+        args.extend(["-map", "[out{0}]".format(i)])
+        args.extend(rendition.get_output_args())
+        args.append(output_path)
+
+    return args
+
+
+class FakeSegmentEncoder(object):
+    """
+    Stand-in for the ffmpeg segment encoder. Each segment output is a text file listing its frames, so the split,
+    the scheduling and the concat list can be checked without ffmpeg.
+    """
+
+    FAILED_EXIT_CODE = 1
+
+    def __init__(self, failed_attempts=None):
+        """
+        :param failed_attempts: optional dict of segment index to how many of its first attempts fail
+        """
+        self.failed_attempts = failed_attempts or {}
+
+    def __call__(self, segment):
+        # encode_segments counts the attempts on the segment
+        if segment.attempts <= self.failed_attempts.get(segment.index, 0):
+            with open(segment.get_log_path(), "w") as log_file:
+                log_file.write("Fake encode of {0} failed on attempt {1}\n".format(segment, segment.attempts))
+            return FakeSegmentEncoder.FAILED_EXIT_CODE
+
+        with open(segment.output_path, "w") as output_file:
+            for frame in range(segment.start_frame, segment.end_frame + 1):
+                output_file.write("{0}\n".format(frame))
+
+        return 0
+
+    def concat(self, list_path, output_path):
+        """
+        Joins the segment outputs in the order of the concat list, as ffmpeg's concat demuxer would.
+        """
+        with open(output_path, "w") as output_file:
+            for path in read_concat_list(list_path):
+                with open(path, "r") as segment_file:
+                    output_file.write(segment_file.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a segmented encode with a stand-in encoder instead of ffmpeg "
+                                                 "and check the joined output covers the frame range in order.")
+    parser.add_argument("start_frame", type=int)
+    parser.add_argument("end_frame", type=int)
+    parser.add_argument("-w", "--workers", type=int, default=4, help="number of parallel encodes")
+    parser.add_argument("-m", "--min-segment-length", type=int, default=1, help="fewest frames per segment")
+    parser.add_argument("-r", "--retries", type=int, default=2, help="retries per failed segment")
+    parser.add_argument("-f", "--fail", type=int, nargs="*", default=[], metavar="INDEX",
+                        help="segments whose first attempt fails")
+    args = parser.parse_args(argv)
+
+    segment_dir = tempfile.mkdtemp(prefix="playblast_encode_")
+    try:
+        segments = create_segments(args.start_frame, args.end_frame, args.workers, segment_dir, ".txt",
+                                   args.min_segment_length)
+        encoder = FakeSegmentEncoder(dict((index, 1) for index in args.fail))
+
+        def on_progress(segment, completed_count, segment_count):
+            print("{0}: exit code {1}, {2}/{3} done".format(segment, segment.return_code, completed_count,
+                                                            segment_count))
+
+        try:
+            encode_segments(segments, encoder, args.workers, args.retries, on_progress)
+        except SegmentEncodeError as e:
+            print(e)
+            return 1
+
+        output_path = os.path.join(segment_dir, "output.txt")
+        encoder.concat(write_concat_list(segments, os.path.join(segment_dir, "segments.txt")), output_path)
+
+        with open(output_path, "r") as output_file:
+            frames = [int(line) for line in output_file]
+        if frames != list(range(args.start_frame, args.end_frame + 1)):
+            print("Joined output does not match the frame range")
+            return 1
+
+        print("{0} segments, {1} encodes, {2} frames joined in order".format(
+            len(segments), sum(segment.attempts for segment in segments), len(frames)))
+        return 0
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import collections
+import queue
+import threading
+import time
+
+from PySide2 import QtCore
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_PREFIXES = {WARNING: "[WARNING] ", ERROR: "[ERROR] "}
+
+
+class LogFileWriter(object):
+    """
+    Appends lines to a file from a background thread.
+    """
+
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        with open(self.path, "a") as log_file:
+            last_flush_time = time.time()
+            while True:
+                try:
+                    line = self.queue.get(timeout=LogFileWriter.FLUSH_INTERVAL)
+                except queue.Empty:
+                    line = ""
+
+                if line is None:
+                    break
+                elif line:
+                    log_file.write(line)
+                    log_file.write("\n")
+
+                if time.time() - last_flush_time >= LogFileWriter.FLUSH_INTERVAL:
+                    log_file.flush()
+                    last_flush_time = time.time()
+
+
+class LogSink(QtCore.QObject):
+    """
+    Keeps recent entries in a ring buffer and sends them to listeners in batches, at most one per flush interval.
+    When a batch overflows only the newest entries are kept.
+    """
+
+    DEFAULT_CAPACITY = 1000
+    DEFAULT_BATCH_SIZE = 200
+    DEFAULT_FLUSH_INTERVAL = 250
+
+    # list of (level, text)
+    entries_logged = QtCore.Signal(list)
+
+    def __init__(self, display=None, display_level=INFO, capacity=DEFAULT_CAPACITY, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, parent=None):
+        """
+        :param display: optional callable taking (level, text), called for entries at or above display_level
+        :param flush_interval: milliseconds between batches
+        """
+        super(LogSink, self).__init__(parent)
+
+        self.display = display
+        self.display_level = display_level
+        self.batch_size = batch_size
+
+        self.entries = collections.deque(maxlen=capacity)
+        self.pending_entries = collections.deque(maxlen=batch_size)
+        self.dropped_count = 0
+
+        self.file_writer = None
+
+        self.flush_timer = QtCore.QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_interval)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def set_display_level(self, level):
+        self.display_level = level
+
+    def set_log_file(self, path):
+        """
+        Writes every entry from now on to the file at path, or stops writing to a file if path is None.
+        """
+        if self.file_writer:
+            self.file_writer.close()
+            self.file_writer = None
+
+        if path:
+            self.file_writer = LogFileWriter(path)
+
+    def log(self, level, text):
+        entry = (level, text)
+        self.entries.append(entry)
+
+        if self.file_writer:
+            self.file_writer.write(self.format_entry(entry))
+
+        if self.display and level >= self.display_level:
+            self.display(level, text)
+
+        if len(self.pending_entries) == self.batch_size:
+            self.dropped_count += 1
+        self.pending_entries.append(entry)
+
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        """
+        Emits the pending entries now. Called by the timer, and by the owner when there is no event loop to run it.
+        """
+        self.flush_timer.stop()
+        if not self.pending_entries:
+            return
+
+        entries = list(self.pending_entries)
+        if self.dropped_count:
+            entries.insert(0, (INFO, "... {0} lines skipped".format(self.dropped_count)))
+
+        self.pending_entries.clear()
+        self.dropped_count = 0
+
+        self.entries_logged.emit(entries)
+
+    def get_entries(self, level=DEBUG):
+        """
+        :return: the most recent entries at or above level, oldest first
+        """
+        return [entry for entry in self.entries if entry[0] >= level]
+
+    def close(self):
+        self.flush()
+        self.set_log_file(None)
+
+    @classmethod
+    def format_entry(cls, entry):
+        level, text = entry
+        return "{0}{1}".format(LEVEL_PREFIXES.get(level, ""), text)
@@ -0,0 +1,351 @@
+"""
+Persistent job queue for playblasting many shots with a pool of headless mayapy workers.
+
+The manifest is a JSON file listing the scenes to playblast:
+
+    {
+        "output_dir": "dailies",
+        "jobs": [
+            {"scene": "shots/sh010.ma", "camera": "sh010_cam", "range": [1001, 1120]},
+            {"scene": "shots/sh020.ma", "camera": "sh020_cam", "range": [1001, 1048], "priority": 10, "retries": 3}
+        ]
+    }
+
+Top level values are used for every job that does not set its own. Higher priority jobs are started first and
+failed jobs are queued again until they run out of retries. Jobs without a camera use the first renderable one.
+
+mayapy has no model panels for cmds.playblast, so each worker renders the frames from the job camera with
+Viewport 2.0 (ogsRender) and encodes them with ffmpeg. The machines running the workers need a GPU.
+
+The queue state is written to a JSON file after every change, so running the same command again after an
+interruption only runs the jobs that have not finished:
+
+    mayapy playblast_queue.py manifest.json --state queue.json --workers 4 --log-dir logs
+
+The queue code does not import Maya. The worker pool is shared with RetimingTool.batch_retime, see mayapy_workers,
+so the scripts directory of the module has to be on PYTHONPATH.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import mayapy_workers
+import playblast_cache
+
+
+DEFAULT_RETRIES = 1
+
+
+class PlayblastJob(mayapy_workers.WorkerJob):
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, scene, camera, frame_range, output_dir, filename=None, priority=0, retries=DEFAULT_RETRIES,
+                 job_id=None):
+        self.scene = scene
+        self.camera = camera
+        self.frame_range = list(frame_range) if frame_range else None
+        self.output_dir = output_dir
+        self.filename = filename or self.get_default_filename()
+        self.priority = priority
+        self.retries = retries
+
+        super(PlayblastJob, self).__init__(job_id or self.get_default_id())
+
+        self.state = PlayblastJob.PENDING
+
+    def __str__(self):
+        return "{0} ({1})".format(self.job_id, self.state)
+
+    def get_default_filename(self):
+        scene_name = os.path.splitext(os.path.basename(self.scene))[0]
+        if self.camera:
+            return "{0}_{1}".format(scene_name, self.camera.split("|")[-1].split(":")[-1])
+        return scene_name
+
+    def get_default_id(self):
+        frame_range = "-".join(str(frame) for frame in self.frame_range) if self.frame_range else "playback"
+        return "{0}|{1}|{2}".format(os.path.normpath(self.scene), self.camera or "", frame_range)
+
+    def is_finished(self):
+        return self.state in (PlayblastJob.SUCCEEDED, PlayblastJob.FAILED)
+
+    def succeeded(self):
+        return self.state == PlayblastJob.SUCCEEDED
+
+    def to_dict(self):
+        return {"id": self.job_id, "scene": self.scene, "camera": self.camera, "range": self.frame_range,
+                "output_dir": self.output_dir, "filename": self.filename, "priority": self.priority,
+                "retries": self.retries, "state": self.state, "attempts": self.attempts,
+                "return_code": self.return_code, "duration": self.duration, "log_path": self.log_path}
+
+    @classmethod
+    def from_dict(cls, job_data):
+        job = PlayblastJob(job_data["scene"], job_data.get("camera"), job_data.get("range"), job_data["output_dir"],
+                           job_data.get("filename"), job_data.get("priority", 0),
+                           job_data.get("retries", DEFAULT_RETRIES), job_data.get("id"))
+
+        job.state = job_data.get("state", PlayblastJob.PENDING)
+        job.attempts = job_data.get("attempts", 0)
+        job.return_code = job_data.get("return_code")
+        job.duration = job_data.get("duration", 0.0)
+        job.log_path = job_data.get("log_path")
+
+        return job
+
+
+class PlayblastQueue(object):
+    """
+    Jobs in insertion order, with their state saved to state_path after every change.
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.jobs = []
+        self.jobs_by_id = {}
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def add_job(self, job):
+        """
+        :return: False if a job with the same id is already queued, keeping its state
+        """
+        if job.job_id in self.jobs_by_id:
+            return False
+
+        self.jobs.append(job)
+        self.jobs_by_id[job.job_id] = job
+        return True
+
+    def get_job(self, job_id):
+        return self.jobs_by_id.get(job_id)
+
+    def get_pending_jobs(self):
+        """
+        :return: pending jobs, highest priority first, in insertion order for equal priorities
+        """
+        pending_jobs = [job for job in self.jobs if job.state == PlayblastJob.PENDING]
+        return sorted(pending_jobs, key=lambda job: -job.priority)
+
+    def get_jobs_in_state(self, state):
+        return [job for job in self.jobs if job.state == state]
+
+    def is_finished(self):
+        return all(job.is_finished() for job in self.jobs)
+
+    def retry_failed_jobs(self):
+        for job in self.get_jobs_in_state(PlayblastJob.FAILED):
+            job.state = PlayblastJob.PENDING
+            job.attempts = 0
+
+    def save(self):
+        if not self.state_path:
+            return
+
+        playblast_cache.save_json(self.state_path, {"jobs": [job.to_dict() for job in self.jobs]}, indent=4)
+
+    @classmethod
+    def load(cls, state_path):
+        """
+        Loads the queue saved at state_path, or an empty queue if there is none. Jobs that were running when the
+        queue was interrupted are pending again.
+        """
+        queue = PlayblastQueue(state_path)
+        if not os.path.exists(state_path):
+            return queue
+
+        with open(state_path, "r") as state_file:
+            state = json.load(state_file)
+
+        for job_data in state.get("jobs", []):
+            job = PlayblastJob.from_dict(job_data)
+            if job.state == PlayblastJob.RUNNING:
+                job.state = PlayblastJob.PENDING
+
+            queue.add_job(job)
+
+        return queue
+
+
+def load_manifest(manifest_path):
+    return mayapy_workers.load_manifest(manifest_path, parse_manifest)
+
+
+def parse_manifest(manifest, base_dir=""):
+    jobs = []
+    for job_entry in manifest.get("jobs", []):
+        if isinstance(job_entry, str):
+            job_entry = {"scene": job_entry}
+
+        output_dir = job_entry.get("output_dir", manifest.get("output_dir"))
+        if not output_dir:
+            raise ValueError("No output directory set for scene: {0}".format(job_entry["scene"]))
+
+        frame_range = job_entry.get("range", manifest.get("range"))
+        if frame_range and (len(frame_range) != 2 or frame_range[0] > frame_range[1]):
+            raise ValueError("Invalid frame range for scene {0}: {1}".format(job_entry["scene"], frame_range))
+
+        jobs.append(PlayblastJob(os.path.join(base_dir, job_entry["scene"]),
+                                 job_entry.get("camera", manifest.get("camera")),
+                                 frame_range,
+                                 os.path.join(base_dir, output_dir),
+                                 job_entry.get("filename"),
+                                 job_entry.get("priority", manifest.get("priority", 0)),
+                                 job_entry.get("retries", manifest.get("retries", DEFAULT_RETRIES)),
+                                 job_entry.get("id")))
+
+    return jobs
+
+
+def get_log_path(log_dir, job):
+    filename = "".join(c if c.isalnum() or c in "-_." else "_" for c in job.filename)
+    return os.path.join(log_dir, "{0}_{1}.log".format(filename, job.attempts))
+
+
+def run_queue(queue, worker, worker_count=mayapy_workers.DEFAULT_WORKER_COUNT, log_dir="playblast_logs",
+              on_result=None):
+    """
+    Runs the pending jobs through the worker across a pool of worker_count processes until every job has
+    succeeded or run out of retries. Whenever a worker is free the highest priority pending job is started,
+    including jobs queued again after a failure.
+
+    Job state is only changed, and saved, in the calling thread.
+
+    :param worker: callable taking (job, log_path) and returning an exit code
+    :param on_result: optional callable receiving each job when an attempt at it completes
+    """
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    def get_next_job():
+        pending_jobs = queue.get_pending_jobs()
+        if not pending_jobs:
+            return None
+
+        job = pending_jobs[0]
+        job.state = PlayblastJob.RUNNING
+        job.attempts += 1
+        job.log_path = get_log_path(log_dir, job)
+        queue.save()
+
+        return job, job.log_path
+
+    def on_job_finished(job, log_path, return_code, duration):
+        job.return_code = return_code
+        job.duration += duration
+
+        if return_code == 0:
+            job.state = PlayblastJob.SUCCEEDED
+        elif job.attempts <= job.retries:
+            job.state = PlayblastJob.PENDING
+        else:
+            job.state = PlayblastJob.FAILED
+        queue.save()
+
+        if on_result:
+            on_result(job)
+
+    mayapy_workers.run_pool(worker, worker_count, get_next_job, on_job_finished)
+
+    return queue.jobs
+
+
+def get_worker(mayapy_path=mayapy_workers.DEFAULT_MAYAPY):
+    plugins_dir = os.path.dirname(os.path.abspath(__file__))
+    return mayapy_workers.MayapyWorker([os.path.abspath(__file__)], [plugins_dir], mayapy_path)
+
+
+def playblast_job(job):
+    """
+    Opens the job scene and renders it from the job camera, or the renderable camera if the job has none. Only
+    called inside a mayapy worker process.
+    """
+    import maya.standalone
+    maya.standalone.initialize()
+
+    from PySide2 import QtCore
+    import maya.cmds as cmds
+
+    from PlayBlast import PlayBlast
+
+    # the ffmpeg process reports through Qt signals
+    if not QtCore.QCoreApplication.instance():
+        app = QtCore.QCoreApplication(sys.argv)
+
+    try:
+        cmds.file(job.scene, open=True, force=True)
+
+        camera = job.camera or get_renderable_camera()
+        if not cmds.objExists(camera):
+            raise RuntimeError("Camera does not exist: {0}".format(camera))
+
+        playblast = PlayBlast(log_to_maya=False)
+        playblast.output_logged.connect(print)
+
+        # mayapy has no model panels, so the frames are rendered from the camera instead of playblasted
+        output_path = playblast.execute(job.output_dir, job.filename, show_in_viewer=False, overwrite=True,
+                                        frame_range=job.frame_range, capture_mode=PlayBlast.CAPTURE_MODE_RENDER,
+                                        asynchronous=False, camera=camera)
+        if not output_path or not os.path.exists(output_path):
+            raise RuntimeError("Playblast failed: {0}".format(job.scene))
+    finally:
+        maya.standalone.uninitialize()
+
+
+def get_renderable_camera():
+    """
+    :return: the first renderable camera in the scene, or persp if there is none. Only called inside a mayapy worker.
+    """
+    import maya.cmds as cmds
+
+    for camera_shape in cmds.ls(type="camera", long=True):
+        if cmds.getAttr("{0}.renderable".format(camera_shape)):
+            return cmds.listRelatives(camera_shape, parent=True, fullPath=True)[0]
+
+    return "persp"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Playblast many shots with a pool of mayapy workers.")
+    parser.add_argument("manifest", nargs="?", help="JSON manifest of scenes to playblast")
+    parser.add_argument("-s", "--state", default="playblast_queue.json", help="file the queue state is saved to")
+    parser.add_argument("-w", "--workers", type=int, default=mayapy_workers.DEFAULT_WORKER_COUNT,
+                        help="number of parallel workers")
+    parser.add_argument("-l", "--log-dir", default="playblast_logs", help="directory for the per-job logs")
+    parser.add_argument("-r", "--retry-failed", action="store_true", help="run jobs that failed in earlier runs")
+    parser.add_argument("--mayapy", default=mayapy_workers.DEFAULT_MAYAPY, help="path to the mayapy executable")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        playblast_job(PlayblastJob.from_dict(json.loads(args.worker)))
+        return 0
+
+    queue = PlayblastQueue.load(args.state)
+    if args.manifest:
+        for job in load_manifest(args.manifest):
+            queue.add_job(job)
+
+    if not len(queue):
+        parser.error("a manifest or an existing queue state is required")
+
+    if args.retry_failed:
+        queue.retry_failed_jobs()
+
+    def on_result(job):
+        print("[{0}] {1} (attempt {2})".format(job.state.upper(), job.job_id, job.attempts))
+
+    jobs = run_queue(queue, get_worker(args.mayapy), args.workers, args.log_dir, on_result)
+    mayapy_workers.print_summary(jobs, "{0} shots playblasted, {1} failed")
+
+    return 0 if all(job.succeeded() for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import re
+import string
+
+
+VERSION_FIELD = "version"
+DEFAULT_FORMAT_SPECS = {VERSION_FIELD: "03d"}
+
+
+class OutputTemplate(object):
+    """
+    Output path pattern with str.format fields, e.g. "{scene}_{camera}_v{version}", parsed once.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.parts = []
+
+        try:
+            for literal_text, field_name, format_spec, conversion in string.Formatter().parse(pattern):
+                if field_name is not None:
+                    if not field_name or not field_name.isidentifier():
+                        raise ValueError("Invalid field")
+                    if conversion:
+                        raise ValueError("Conversions are not supported")
+
+                    format_spec = format_spec or DEFAULT_FORMAT_SPECS.get(field_name, "")
+
+                self.parts.append((literal_text, field_name, format_spec))
+        except ValueError as e:
+            raise ValueError("Invalid output template {0}: {1}".format(pattern, e))
+
+        self.fields = set(field_name for _, field_name, _ in self.parts if field_name is not None)
+
+    def __str__(self):
+        return self.pattern
+
+    def render(self, values):
+        """
+        :param values: dict of field name to value, or a callable taking a field name and returning its value
+        """
+        get_value = values if callable(values) else values.__getitem__
+
+        text = []
+        for literal_text, field_name, format_spec in self.parts:
+            text.append(literal_text)
+            if field_name is not None:
+                try:
+                    value = get_value(field_name)
+                except KeyError:
+                    raise ValueError("Unknown output template field {{{0}}} in: {1}".format(field_name, self.pattern))
+
+                text.append(format(value, format_spec))
+
+        return "".join(text)
+
+
+class VersionPlaceholder(object):
+    """
+    Renders as a marker whatever the format spec, so the version can be located in a rendered path.
+    """
+
+    MARKER = "\0version\0"
+
+    def __format__(self, format_spec):
+        return VersionPlaceholder.MARKER
+
+
+class DirectoryIndex(object):
+    """
+    Names in each directory, listed on first use and then kept up to date by add_name instead of listing again.
+    """
+
+    def __init__(self):
+        self.names = {}
+
+    def get_names(self, dir_path):
+        dir_path = os.path.normpath(dir_path)
+
+        names = self.names.get(dir_path)
+        if names is None:
+            names = set(entry.name for entry in os.scandir(dir_path)) if os.path.isdir(dir_path) else set()
+            self.names[dir_path] = names
+
+        return names
+
+    def add_name(self, dir_path, name):
+        self.get_names(dir_path).add(name)
+
+    def add_path(self, path):
+        """
+        Adds every component of a newly written path to its directory, for the directories already listed.
+        """
+        path = os.path.normpath(path)
+        while True:
+            dir_path, name = os.path.split(path)
+            if not name:
+                break
+
+            names = self.names.get(dir_path)
+            if names is not None:
+                names.add(name)
+
+            path = dir_path
+
+    def invalidate(self, dir_path=None):
+        if dir_path:
+            self.names.pop(os.path.normpath(dir_path), None)
+        else:
+            self.names = {}
+
+
+_templates = {}
+
+
+def get_template(pattern):
+    """
+    :return: the compiled OutputTemplate for the pattern, compiled on first use
+    """
+    template = _templates.get(pattern)
+    if template is None:
+        template = OutputTemplate(pattern)
+        _templates[pattern] = template
+
+    return template
+
+
+def split_path(path):
+    return re.split(r"[\\/]", path)
+
+
+def get_next_version(path_template, values, directory_index):
+    """
+    :param path_template: OutputTemplate of the whole output path, using {version} in one path component
+    :param values: callable taking a field name and returning its value, called for every field except version
+    :return: one more than the highest version in use, or 1 if there is none
+    """
+    def get_value(field_name):
+        if field_name == VERSION_FIELD:
+            return VersionPlaceholder()
+        return values(field_name)
+
+    components = split_path(path_template.render(get_value))
+    for index, component in enumerate(components):
+        if VersionPlaceholder.MARKER in component:
+            break
+    else:
+        return 1
+
+    prefix, suffix = component.split(VersionPlaceholder.MARKER, 1)
+    if VersionPlaceholder.MARKER in suffix:
+        raise ValueError("{{version}} may only be used once per path component: {0}".format(path_template))
+
+    # the container extension may be added after the template is rendered
+    version_regex = re.compile(r"^{0}(\d+){1}(\.[^.]*)?$".format(re.escape(prefix), re.escape(suffix)))
+
+    dir_path = os.sep.join(components[:index]) or os.curdir
+    versions = [int(match.group(1)) for match in map(version_regex.match, directory_index.get_names(dir_path))
+                if match]
+
+    return max(versions) + 1 if versions else 1
@@ -0,0 +1,188 @@
+import array
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+import maya.cmds as cmds
+
+from RetimingTool.retiming_planner import build_retime_plan, plan_keyframe_moves
+
+
+def maya_useNewAPI():
+    pass
+
+
+class RetimeCmd(om.MPxCommand):
+    """
+    Retimes the keys of the selected objects as a single undoable command.
+
+    Only the old and new key times of each curve are kept for undo/redo, so a large retime is one undo entry and
+    undoing it is a single bulk pass over the curves.
+    """
+    COMMAND_NAME = "RetimeCmd"
+
+    RETIME_FLAG = ["-r", "-retime", om.MSyntax.kDouble]
+    INCREMENTAL_FLAG = ["-i", "-incremental", om.MSyntax.kBoolean]
+    START_TIME_FLAG = ["-st", "-startTime", om.MSyntax.kDouble]
+    END_TIME_FLAG = ["-et", "-endTime", om.MSyntax.kDouble]
+    MOVE_TO_NEXT_FLAG = ["-mn", "-moveToNext", om.MSyntax.kBoolean]
+
+    def __init__(self):
+        super(RetimeCmd, self).__init__()
+
+        self.time_unit = om.MTime.uiUnit()
+
+        # (anim curve, old key times, new key times) for every curve the retime changes
+        self.curve_times = []
+
+        self.old_current_time = None
+        self.new_current_time = None
+
+    def doIt(self, arg_list):
+        try:
+            arg_db = om.MArgDatabase(self.syntax(), arg_list)
+        except:
+            self.displayError("Error parsing arguments")
+            raise
+
+        if not arg_db.isFlagSet(RetimeCmd.RETIME_FLAG[0]):
+            raise RuntimeError("The retime flag is required")
+
+        retime_value = arg_db.flagArgumentDouble(RetimeCmd.RETIME_FLAG[0], 0)
+
+        incremental = True
+        if arg_db.isFlagSet(RetimeCmd.INCREMENTAL_FLAG[0]):
+            incremental = arg_db.flagArgumentBool(RetimeCmd.INCREMENTAL_FLAG[0], 0)
+
+        move_to_next = False
+        if arg_db.isFlagSet(RetimeCmd.MOVE_TO_NEXT_FLAG[0]):
+            move_to_next = arg_db.flagArgumentBool(RetimeCmd.MOVE_TO_NEXT_FLAG[0], 0)
+
+        self.old_current_time = oma.MAnimControl.currentTime().asUnits(self.time_unit)
+
+        # matches the time slider, which selects the current frame when no range is highlighted
+        range_start_time = self.old_current_time
+        if arg_db.isFlagSet(RetimeCmd.START_TIME_FLAG[0]):
+            range_start_time = arg_db.flagArgumentDouble(RetimeCmd.START_TIME_FLAG[0], 0)
+
+        range_end_time = range_start_time + 1
+        if arg_db.isFlagSet(RetimeCmd.END_TIME_FLAG[0]):
+            range_end_time = arg_db.flagArgumentDouble(RetimeCmd.END_TIME_FLAG[0], 0)
+
+        anim_curves = self.get_anim_curves(arg_db.getObjectList())
+
+        all_curve_times = []
+        keyframe_times = set()
+        for anim_curve in anim_curves:
+            curve_times = self.get_anim_curve_times(oma.MFnAnimCurve(anim_curve))
+            all_curve_times.append(curve_times)
+            keyframe_times.update(curve_times)
+
+        retime_plan = build_retime_plan(sorted(keyframe_times), range_start_time, range_end_time, retime_value,
+                                        incremental, move_to_next)
+        time_map = dict(zip(retime_plan.old_keyframe_times, retime_plan.new_keyframe_times))
+
+        for anim_curve, old_times in zip(anim_curves, all_curve_times):
+            # keys before the start keyframe are not in the time map and keep their time
+            new_times = array.array("d", [time_map.get(time, time) for time in old_times])
+            if new_times != old_times:
+                self.curve_times.append((anim_curve, old_times, new_times))
+
+        self.new_current_time = retime_plan.current_time
+
+        self.redoIt()
+
+    def undoIt(self):
+        for anim_curve, old_times, new_times in self.curve_times:
+            self.set_anim_curve_times(oma.MFnAnimCurve(anim_curve), new_times, old_times)
+
+        if self.new_current_time is not None:
+            oma.MAnimControl.setCurrentTime(om.MTime(self.old_current_time, self.time_unit))
+
+    def redoIt(self):
+        for anim_curve, old_times, new_times in self.curve_times:
+            self.set_anim_curve_times(oma.MFnAnimCurve(anim_curve), old_times, new_times)
+
+        if self.new_current_time is not None:
+            oma.MAnimControl.setCurrentTime(om.MTime(self.new_current_time, self.time_unit))
+
+        self.setResult(len(self.curve_times))
+
+    def isUndoable(self):
+        return True
+
+    def get_anim_curves(self, selection_list):
+        """
+        :return: every time driven anim curve of the selection once, driven key curves are not keyed in time
+        """
+        anim_curves = []
+        curve_hash_codes = set()
+        for i in range(selection_list.length()):
+            obj = selection_list.getDependNode(i)
+            if obj.hasFn(om.MFn.kAnimCurve):
+                curves = [obj]
+            else:
+                curves = oma.MAnimUtil.findAnimation(obj)
+
+            for curve in curves:
+                # a curve and the node it drives can both be selected
+                hash_code = om.MObjectHandle(curve).hashCode()
+                if hash_code not in curve_hash_codes and oma.MFnAnimCurve(curve).isTimeInput:
+                    curve_hash_codes.add(hash_code)
+                    anim_curves.append(curve)
+
+        return anim_curves
+
+    def get_anim_curve_times(self, anim_curve_fn):
+        return array.array("d", [anim_curve_fn.input(i).asUnits(self.time_unit) for i in range(anim_curve_fn.numKeys)])
+
+    def set_anim_curve_times(self, anim_curve_fn, from_times, to_times):
+        # keys keep their order, so a key's index is its position in from_times
+        key_indices = dict((time, index) for index, time in enumerate(from_times))
+        for old_time, new_time in plan_keyframe_moves(from_times, to_times):
+            anim_curve_fn.setInput(key_indices[old_time], om.MTime(new_time, self.time_unit))
+
+    @classmethod
+    def creator(cls):
+        return RetimeCmd()
+
+    @classmethod
+    def create_syntax(cls):
+
+        syntax = om.MSyntax()
+
+        syntax.addFlag(*cls.RETIME_FLAG)
+        syntax.addFlag(*cls.INCREMENTAL_FLAG)
+        syntax.addFlag(*cls.START_TIME_FLAG)
+        syntax.addFlag(*cls.END_TIME_FLAG)
+        syntax.addFlag(*cls.MOVE_TO_NEXT_FLAG)
+
+        syntax.setObjectType(om.MSyntax.kSelectionList, 1)
+        syntax.useSelectionAsDefault(True)
+        return syntax
+
+
+def initializePlugin(plugin):
+    vendor = "Scott Woodhams"
+    version = "1.0.0"
+    plugin_fn = om.MFnPlugin(plugin, vendor, version)
+    try:
+        plugin_fn.registerCommand(RetimeCmd.COMMAND_NAME, RetimeCmd.creator, RetimeCmd.create_syntax)
+    except:
+        om.MGlobal.displayError("Failed to register command: {0}".format(RetimeCmd.COMMAND_NAME))
+
+
+def uninitializePlugin(plugin):
+    plugin_fn = om.MFnPlugin(plugin)
+    try:
+        plugin_fn.deregisterCommand(RetimeCmd.COMMAND_NAME)
+    except:
+        om.MGlobal.displayError("Failed to deregister command: {0}".format(RetimeCmd.COMMAND_NAME))
+
+
+if __name__ == "__main__":
+    cmds.file(new=True, force=True)
+
+    plugin_name = "retime_cmd.py"
+
+    cmds.evalDeferred('if cmds.pluginInfo("{0}", q=True, loaded=True): cmds.unloadPlugin("{0}")'.format(plugin_name))
+    cmds.evalDeferred('if not cmds.pluginInfo("{0}", q=True, loaded=True): cmds.loadPlugin("{0}")'.format(plugin_name))
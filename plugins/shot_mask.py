@@ -1,4 +1,13 @@
+import collections
+import getpass
+import json
+import math
+import os
+import re
+import time
+
 import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
 import maya.api.OpenMayaRender as omr
 import maya.api.OpenMayaUI as omui
 
@@ -118,6 +127,11 @@ class ShotMaskData(om.MUserData):
     def __init__(self):
         super(ShotMaskData, self).__init__(False)
 
+        # ShotMaskDrawOverride.attrs_version the attribute values were read at
+        self.attrs_version = -1
+
+        self.camera_name = ""
+        self.text_fields = []
         self.parsed_fields = []
 
         self.current_time = 0
@@ -139,6 +153,8 @@ class ShotMaskData(om.MUserData):
         self.mask_width = 0
         self.mask_height = 0
 
+        self.layout = None
+
     def __str__(self):
         output = ""
         output += "Text Fields: {0}\n".format(self.parsed_fields)
@@ -159,12 +175,472 @@ class ShotMaskData(om.MUserData):
         return output
 
 
+class CameraNameIndex(object):
+    """
+    Transform and shape names of every camera in the scene. Callbacks mark the index dirty when cameras are added,
+    removed, renamed or reparented, and it is rebuilt on the next lookup instead of scanning the scene every draw.
+    """
+
+    names = set()
+    dirty = True
+
+    callback_ids = []
+
+    @classmethod
+    def contains(cls, name):
+        if CameraNameIndex.dirty:
+            cls.rebuild()
+
+        return name in CameraNameIndex.names
+
+    @classmethod
+    def rebuild(cls):
+        names = set()
+
+        dg_iter = om.MItDependencyNodes(om.MFn.kCamera)
+        while not dg_iter.isDone():
+            camera_fn = om.MFnDagNode(dg_iter.thisNode())
+            names.add(camera_fn.name())
+            for i in range(camera_fn.parentCount()):
+                names.add(om.MFnDependencyNode(camera_fn.parent(i)).name())
+
+            dg_iter.next()
+
+        CameraNameIndex.names = names
+        CameraNameIndex.dirty = False
+
+    @classmethod
+    def invalidate(cls, *args):
+        CameraNameIndex.dirty = True
+
+    @classmethod
+    def on_name_changed(cls, obj, prev_name, client_data):
+        # renamed camera shapes and transforms always had their previous name indexed
+        if prev_name in CameraNameIndex.names or obj.hasFn(om.MFn.kCamera):
+            cls.invalidate()
+
+    @classmethod
+    def on_parent_added(cls, child_path, parent_path, client_data):
+        if child_path.hasFn(om.MFn.kCamera):
+            cls.invalidate()
+
+    @classmethod
+    def add_callbacks(cls):
+        callback_ids = CameraNameIndex.callback_ids
+        if callback_ids:
+            return
+
+        callback_ids.append(om.MDGMessage.addNodeAddedCallback(cls.invalidate, "camera"))
+        callback_ids.append(om.MDGMessage.addNodeRemovedCallback(cls.invalidate, "camera"))
+        callback_ids.append(om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj, cls.on_name_changed))
+        callback_ids.append(om.MDagMessage.addParentAddedCallback(cls.on_parent_added))
+        callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, cls.invalidate))
+        callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, cls.invalidate))
+
+        cls.invalidate()
+
+    @classmethod
+    def remove_callbacks(cls):
+        callback_ids = CameraNameIndex.callback_ids
+        if callback_ids:
+            om.MMessage.removeCallbacks(callback_ids)
+            del callback_ids[:]
+
+        CameraNameIndex.names = set()
+        CameraNameIndex.dirty = True
+
+
+class ShotMaskTokens(object):
+    """
+    Tokens for the text fields, e.g. "{scene} - {camera} {focal_length}mm" or "{frame}".
+
+    Each text is compiled once into literal and token segments. Static tokens are queried once and cached until
+    a scene is opened, saved or created or the time unit changes, so only the frame dependent tokens are evaluated
+    on each draw.
+    """
+
+    TOKEN_REGEX = re.compile(r"\{(\w+)\}")
+
+    STATIC_TOKENS = ["scene", "user", "date", "fps"]
+    DYNAMIC_TOKENS = ["frame", "camera", "focal_length"]
+
+    # the date is refreshed at this interval, in seconds, in case a session runs past midnight
+    DATE_REFRESH_INTERVAL = 60.0
+
+    compiled_texts = {}
+    static_values = {}
+    static_texts = {}
+    date_time = 0.0
+
+    callback_ids = []
+
+    @classmethod
+    def compile(cls, text):
+        """
+        :return: list of segments, each a literal string or a (token,) tuple, and whether a token is dynamic
+        """
+        compiled_text = ShotMaskTokens.compiled_texts.get(text)
+        if compiled_text is None:
+            segments = []
+            is_dynamic = False
+
+            position = 0
+            for match in cls.TOKEN_REGEX.finditer(text):
+                token = match.group(1)
+                if token not in cls.STATIC_TOKENS and token not in cls.DYNAMIC_TOKENS:
+                    # unknown tokens are drawn as they are
+                    continue
+
+                segments.append(text[position:match.start()])
+                segments.append((token,))
+                is_dynamic = is_dynamic or token in cls.DYNAMIC_TOKENS
+                position = match.end()
+
+            segments.append(text[position:])
+
+            compiled_text = ([segment for segment in segments if segment], is_dynamic)
+            ShotMaskTokens.compiled_texts[text] = compiled_text
+
+        return compiled_text
+
+    @classmethod
+    def evaluate(cls, text, camera_path, data):
+        if time.time() - ShotMaskTokens.date_time > cls.DATE_REFRESH_INTERVAL:
+            cls.invalidate()
+
+        segments, is_dynamic = cls.compile(text)
+        if not is_dynamic:
+            static_text = ShotMaskTokens.static_texts.get(text)
+            if static_text is None:
+                static_text = cls.join_segments(segments, camera_path, data)
+                ShotMaskTokens.static_texts[text] = static_text
+
+            return static_text
+
+        return cls.join_segments(segments, camera_path, data)
+
+    @classmethod
+    def join_segments(cls, segments, camera_path, data):
+        text = []
+        for segment in segments:
+            if isinstance(segment, tuple):
+                text.append(cls.get_value(segment[0], camera_path, data))
+            else:
+                text.append(segment)
+
+        return "".join(text)
+
+    @classmethod
+    def get_value(cls, token, camera_path, data):
+        if token == "frame":
+            return str(data.current_time).zfill(data.counter_padding)
+        elif token == "camera":
+            return om.MFnDagNode(camera_path.transform()).name()
+        elif token == "focal_length":
+            return "{0:.1f}".format(om.MFnCamera(camera_path).focalLength)
+
+        value = ShotMaskTokens.static_values.get(token)
+        if value is None:
+            value = cls.get_static_value(token)
+            ShotMaskTokens.static_values[token] = value
+
+        return value
+
+    @classmethod
+    def get_static_value(cls, token):
+        if token == "scene":
+            scene_name = cmds.file(q=True, sceneName=True, shortName=True)
+            return os.path.splitext(scene_name)[0] if scene_name else "untitled"
+        elif token == "user":
+            return getpass.getuser()
+        elif token == "date":
+            return time.strftime("%Y-%m-%d")
+        elif token == "fps":
+            return "{0:g}".format(om.MTime(1.0, om.MTime.kSeconds).asUnits(om.MTime.uiUnit()))
+
+        return ""
+
+    @classmethod
+    def invalidate(cls, *args):
+        ShotMaskTokens.static_values = {}
+        ShotMaskTokens.static_texts = {}
+        ShotMaskTokens.date_time = time.time()
+
+    @classmethod
+    def add_callbacks(cls):
+        callback_ids = ShotMaskTokens.callback_ids
+        if callback_ids:
+            return
+
+        for message in [om.MSceneMessage.kAfterOpen, om.MSceneMessage.kAfterNew, om.MSceneMessage.kAfterSave]:
+            callback_ids.append(om.MSceneMessage.addCallback(message, cls.invalidate))
+        callback_ids.append(om.MEventMessage.addEventCallback("timeUnitChanged", cls.invalidate))
+
+    @classmethod
+    def remove_callbacks(cls):
+        callback_ids = ShotMaskTokens.callback_ids
+        if callback_ids:
+            om.MMessage.removeCallbacks(callback_ids)
+            del callback_ids[:]
+
+        ShotMaskTokens.compiled_texts = {}
+        cls.invalidate()
+
+
+class ShotMaskLayout(object):
+    """
+    Mask geometry in viewport coordinates.
+    """
+
+    def __init__(self, vp_width, vp_height, mask_width, mask_height, border_scale, font_scale, text_padding):
+        self.mask_width = mask_width
+        self.mask_height = mask_height
+
+        vp_half_width = 0.5 * vp_width
+        vp_half_height = 0.5 * vp_height
+
+        mask_x = vp_half_width - 0.5 * mask_width
+        mask_bottom_y = vp_half_height - 0.5 * mask_height
+        mask_top_y = vp_half_height + 0.5 * mask_height
+
+        self.border_height = int(0.05 * mask_height * border_scale)
+        self.background_size = (int(mask_width), self.border_height)
+        self.font_size = int(0.85 * self.border_height * font_scale)
+
+        self.top_border_position = om.MPoint(mask_x, mask_top_y - self.border_height, 0.1)
+        self.bottom_border_position = om.MPoint(mask_x, mask_bottom_y, 0.1)
+
+        # (position, alignment) of each text field, in ShotMaskLocator.TEXT_ATTRS order
+        self.label_anchors = []
+        for y in [mask_top_y - self.border_height, mask_bottom_y]:
+            self.label_anchors.append((om.MPoint(mask_x + text_padding, y, 0.0), omr.MUIDrawManager.kLeft))
+            self.label_anchors.append((om.MPoint(vp_half_width, y, 0.0), omr.MUIDrawManager.kCenter))
+            self.label_anchors.append((om.MPoint(mask_x + mask_width - text_padding, y, 0.0),
+                                       omr.MUIDrawManager.kRight))
+
+
+class ShotMaskLayoutCache(object):
+    """
+    Layouts by camera, viewport size and mask attributes, shared by every mask and panel. The layouts of a camera
+    are removed when its film fit or overscan changes or it is deleted, and all layouts when the render resolution
+    changes.
+    """
+
+    MAX_LAYOUT_COUNT = 256
+
+    CAMERA_ATTRS = ["filmFit", "overscan"]
+    RESOLUTION_NODE = "defaultResolution"
+
+    layouts = {}
+    # camera key to the MObjectHandle of the camera it was made from, hash codes can be reused after a deletion
+    camera_handles = {}
+    # camera key to its attribute changed callback id
+    camera_callback_ids = {}
+    # camera key to whether its film fit and overscan can be cached, None until checked
+    cacheable_cameras = {}
+
+    callback_ids = []
+    resolution_callback_ids = []
+
+    @classmethod
+    def get_layout_key(cls, camera_path, vp_width, vp_height, data):
+        camera_obj = camera_path.node()
+        camera_key = om.MObjectHandle(camera_obj).hashCode()
+
+        camera_handle = ShotMaskLayoutCache.camera_handles.get(camera_key)
+        if camera_handle and not (camera_handle.isValid() and camera_handle.object() == camera_obj):
+            cls.remove_camera(camera_key)
+
+        return camera_key, vp_width, vp_height, data.border_scale, data.font_scale, data.text_padding
+
+    @classmethod
+    def get_layout(cls, layout_key):
+        return ShotMaskLayoutCache.layouts.get(layout_key)
+
+    @classmethod
+    def add_layout(cls, camera_path, layout_key, layout):
+        camera_key = layout_key[0]
+        camera_obj = camera_path.node()
+
+        if camera_key not in ShotMaskLayoutCache.camera_callback_ids:
+            ShotMaskLayoutCache.camera_handles[camera_key] = om.MObjectHandle(camera_obj)
+            ShotMaskLayoutCache.camera_callback_ids[camera_key] = om.MNodeMessage.addAttributeChangedCallback(
+                camera_obj, cls.on_camera_attribute_changed, camera_key)
+
+        is_cacheable = ShotMaskLayoutCache.cacheable_cameras.get(camera_key)
+        if is_cacheable is None:
+            # connected (e.g. keyed) attributes change without an attribute changed message
+            camera_fn = om.MFnDependencyNode(camera_obj)
+            is_cacheable = not any(camera_fn.findPlug(attr_name, False).isDestination
+                                   for attr_name in cls.CAMERA_ATTRS)
+            ShotMaskLayoutCache.cacheable_cameras[camera_key] = is_cacheable
+
+        if not is_cacheable:
+            return
+
+        if len(ShotMaskLayoutCache.layouts) >= cls.MAX_LAYOUT_COUNT:
+            ShotMaskLayoutCache.layouts = {}
+
+        ShotMaskLayoutCache.layouts[layout_key] = layout
+
+    @classmethod
+    def invalidate_camera(cls, camera_key):
+        # the callback stays registered, this is called from it
+        ShotMaskLayoutCache.cacheable_cameras.pop(camera_key, None)
+        ShotMaskLayoutCache.layouts = dict((layout_key, layout) for layout_key, layout
+                                           in ShotMaskLayoutCache.layouts.items() if layout_key[0] != camera_key)
+
+    @classmethod
+    def remove_camera(cls, camera_key):
+        callback_id = ShotMaskLayoutCache.camera_callback_ids.pop(camera_key, None)
+        if callback_id is not None:
+            om.MMessage.removeCallback(callback_id)
+
+        ShotMaskLayoutCache.camera_handles.pop(camera_key, None)
+        cls.invalidate_camera(camera_key)
+
+    @classmethod
+    def invalidate(cls, *args):
+        ShotMaskLayoutCache.cacheable_cameras = {}
+        ShotMaskLayoutCache.layouts = {}
+
+    @classmethod
+    def on_camera_attribute_changed(cls, msg, plug, other_plug, camera_key):
+        if msg & (om.MNodeMessage.kConnectionMade | om.MNodeMessage.kConnectionBroken) or \
+                (msg & om.MNodeMessage.kAttributeSet and om.MFnAttribute(plug.attribute()).name in cls.CAMERA_ATTRS):
+            cls.invalidate_camera(camera_key)
+
+    @classmethod
+    def on_camera_removed(cls, node, client_data):
+        camera_key = om.MObjectHandle(node).hashCode()
+
+        camera_handle = ShotMaskLayoutCache.camera_handles.get(camera_key)
+        if camera_handle and camera_handle.object() == node:
+            cls.remove_camera(camera_key)
+
+    @classmethod
+    def on_resolution_attribute_changed(cls, msg, plug, other_plug, client_data):
+        if msg & (om.MNodeMessage.kAttributeSet | om.MNodeMessage.kConnectionMade |
+                  om.MNodeMessage.kConnectionBroken):
+            cls.invalidate()
+
+    @classmethod
+    def remove_camera_callbacks(cls):
+        if ShotMaskLayoutCache.camera_callback_ids:
+            om.MMessage.removeCallbacks(list(ShotMaskLayoutCache.camera_callback_ids.values()))
+            ShotMaskLayoutCache.camera_callback_ids = {}
+
+        ShotMaskLayoutCache.camera_handles = {}
+
+    @classmethod
+    def on_scene_changed(cls, *args):
+        cls.remove_camera_callbacks()
+        cls.invalidate()
+        cls.add_resolution_callbacks()
+
+    @classmethod
+    def add_resolution_callbacks(cls):
+        cls.remove_resolution_callbacks()
+
+        selection_list = om.MSelectionList()
+        try:
+            selection_list.add(cls.RESOLUTION_NODE)
+        except RuntimeError:
+            return
+
+        ShotMaskLayoutCache.resolution_callback_ids.append(om.MNodeMessage.addAttributeChangedCallback(
+            selection_list.getDependNode(0), cls.on_resolution_attribute_changed))
+
+    @classmethod
+    def remove_resolution_callbacks(cls):
+        callback_ids = ShotMaskLayoutCache.resolution_callback_ids
+        if callback_ids:
+            om.MMessage.removeCallbacks(callback_ids)
+            del callback_ids[:]
+
+    @classmethod
+    def add_callbacks(cls):
+        callback_ids = ShotMaskLayoutCache.callback_ids
+        if callback_ids:
+            return
+
+        callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, cls.on_scene_changed))
+        callback_ids.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, cls.on_scene_changed))
+        callback_ids.append(om.MDGMessage.addNodeRemovedCallback(cls.on_camera_removed, "camera"))
+
+        cls.add_resolution_callbacks()
+
+    @classmethod
+    def remove_callbacks(cls):
+        callback_ids = ShotMaskLayoutCache.callback_ids
+        if callback_ids:
+            om.MMessage.removeCallbacks(callback_ids)
+            del callback_ids[:]
+
+        cls.remove_resolution_callbacks()
+        cls.remove_camera_callbacks()
+        cls.invalidate()
+
+
 class ShotMaskDrawOverride(omr.MPxDrawOverride):
     NAME = "shotmask_draw_override"
 
+    # attributes read into ShotMaskData and the MPlug method that reads them
+    DATA_ATTRS = ([("camera", "asString")] +
+                  [(attr_name, "asString") for attr_name, _ in ShotMaskLocator.TEXT_ATTRS] +
+                  [("counterPadding", "asInt"), ("textPadding", "asInt"), ("fontName", "asString"),
+                   ("fontColorR", "asFloat"), ("fontColorG", "asFloat"), ("fontColorB", "asFloat"),
+                   ("fontAlpha", "asFloat"), ("fontScale", "asFloat"),
+                   ("borderColorR", "asFloat"), ("borderColorG", "asFloat"), ("borderColorB", "asFloat"),
+                   ("borderAlpha", "asFloat"), ("borderScale", "asFloat"),
+                   ("topBorder", "asBool"), ("bottomBorder", "asBool")])
+
+    ATTR_GROUPS = [[attr_name for attr_name, _ in ShotMaskLocator.TEXT_ATTRS],
+                   ["fontColorR", "fontColorG", "fontColorB", "fontAlpha"],
+                   ["borderColorR", "borderColorG", "borderColorB", "borderAlpha"]]
+
+    ATTRS_CHANGED_MESSAGES = (om.MNodeMessage.kAttributeSet | om.MNodeMessage.kConnectionMade |
+                              om.MNodeMessage.kConnectionBroken)
+
     def __init__(self, obj):
         super(ShotMaskDrawOverride, self).__init__(obj, None)
 
+        self.node_handle = om.MObjectHandle(obj)
+
+        # resolved once per node instead of on every draw
+        node_fn = om.MFnDependencyNode(obj)
+        self.plugs = dict((attr_name, node_fn.findPlug(attr_name, False)) for attr_name, _ in self.DATA_ATTRS)
+
+        # bumped by the attribute changed callback, the data of every panel is read again when it changes
+        self.attrs_version = 0
+        # connected (e.g. keyed) attributes change without an attribute changed message and are read on every draw
+        self.connected_attrs = []
+
+        self.callback_ids = []
+        self.add_callbacks()
+
+    def add_callbacks(self):
+        if self.callback_ids or not self.node_handle.isValid():
+            return
+
+        obj = self.node_handle.object()
+        self.callback_ids.append(om.MNodeMessage.addAttributeChangedCallback(obj, self.on_attribute_changed))
+        self.callback_ids.append(om.MNodeMessage.addNodePreRemovalCallback(obj, self.on_node_pre_removal))
+
+    def remove_callbacks(self):
+        if self.callback_ids:
+            om.MMessage.removeCallbacks(self.callback_ids)
+            self.callback_ids = []
+
+    def on_attribute_changed(self, msg, plug, other_plug, client_data):
+        if msg & self.ATTRS_CHANGED_MESSAGES:
+            self.attrs_version += 1
+
+    def on_node_pre_removal(self, obj, client_data):
+        # added again if the deletion is undone and the node is drawn
+        self.remove_callbacks()
+        self.attrs_version += 1
+
     def supportedDrawAPIs(self):
         return omr.MRenderer.kAllDevices
 
@@ -177,56 +653,87 @@ class ShotMaskDrawOverride(omr.MPxDrawOverride):
         if not isinstance(data, ShotMaskData):
             data = ShotMaskData()
 
-        dag_fn = om.MFnDagNode(obj_path)
-
-        camera_name = dag_fn.findPlug("camera", False).asString()
-        if camera_name and self.camera_exists(camera_name) and not self.is_camera_match(camera_path, camera_name):
-            return None
-
-        data.parsed_fields = []
-        for i in range(0, len(ShotMaskLocator.TEXT_ATTRS)):
-            orig_text = dag_fn.findPlug(ShotMaskLocator.TEXT_ATTRS[i][0], False).asString()
-            parsed_text = self.parse_text(orig_text, camera_path, data)
-            data.parsed_fields.append(parsed_text)
-
-        data.current_time = int(cmds.currentTime(q=True))
+        self.add_callbacks()
 
-        data.counter_padding = dag_fn.findPlug("counterPadding", False).asInt()
-        data.text_padding = dag_fn.findPlug("textPadding", False).asInt()
+        # attribute values are only read again after they changed, or every draw if they are connected
+        if data.attrs_version != self.attrs_version:
+            self.update_connected_attrs()
+            self.read_attrs(data, self.DATA_ATTRS)
+            data.attrs_version = self.attrs_version
+        elif self.connected_attrs:
+            self.read_attrs(data, self.connected_attrs)
 
-        data.font_name = dag_fn.findPlug("fontName", False).asString()
-
-        r = dag_fn.findPlug("fontColorR", False).asFloat()
-        g = dag_fn.findPlug("fontColorG", False).asFloat()
-        b = dag_fn.findPlug("fontColorB", False).asFloat()
-        a = dag_fn.findPlug("fontAlpha", False).asFloat()
-        data.font_color = om.MColor((r, g, b, a))
-
-        data.font_scale = dag_fn.findPlug("fontScale", False).asFloat()
-
-        r = dag_fn.findPlug("borderColorR", False).asFloat()
-        g = dag_fn.findPlug("borderColorG", False).asFloat()
-        b = dag_fn.findPlug("borderColorB", False).asFloat()
-        a = dag_fn.findPlug("borderAlpha", False).asFloat()
-        data.border_color = om.MColor((r, g, b, a))
+        if data.camera_name and self.camera_exists(data.camera_name) and \
+                not self.is_camera_match(camera_path, data.camera_name):
+            return None
 
-        data.border_scale = dag_fn.findPlug("borderScale", False).asFloat()
+        # frame dependent fields
+        data.current_time = int(oma.MAnimControl.currentTime().value)
 
-        data.top_border = dag_fn.findPlug("topBorder", False).asBool()
-        data.bottom_border = dag_fn.findPlug("bottomBorder", False).asBool()
+        data.parsed_fields = []
+        for orig_text in data.text_fields:
+            data.parsed_fields.append(self.parse_text(orig_text, camera_path, data))
 
         vp_x, vp_y, data.vp_width, data.vp_height = frame_context.getViewportDimensions()
         if not (data.vp_width and data.vp_height):
             return None
 
-        data.mask_width, data.mask_height = self.get_mask_width_height(camera_path, data.vp_width, data.vp_height)
-        if not (data.mask_width and data.mask_height):
-            return None
+        layout_key = ShotMaskLayoutCache.get_layout_key(camera_path, data.vp_width, data.vp_height, data)
+        data.layout = ShotMaskLayoutCache.get_layout(layout_key)
+        if not data.layout:
+            mask_width, mask_height = self.get_mask_width_height(camera_path, data.vp_width, data.vp_height)
+            if not (mask_width and mask_height):
+                return None
+
+            data.layout = ShotMaskLayout(data.vp_width, data.vp_height, mask_width, mask_height, data.border_scale,
+                                         data.font_scale, data.text_padding)
+            ShotMaskLayoutCache.add_layout(camera_path, layout_key, data.layout)
+
+        data.mask_width = data.layout.mask_width
+        data.mask_height = data.layout.mask_height
 
         # print(data)
 
         return data
 
+    def update_connected_attrs(self):
+        connected_attr_names = set()
+        for attr_name, _ in self.DATA_ATTRS:
+            plug = self.plugs[attr_name]
+            if plug.isDestination or (plug.isChild and plug.parent().isDestination):
+                connected_attr_names.add(attr_name)
+
+        # colors and text fields are set from all of their attributes
+        for attr_names in self.ATTR_GROUPS:
+            if connected_attr_names.intersection(attr_names):
+                connected_attr_names.update(attr_names)
+
+        self.connected_attrs = [(attr_name, reader) for attr_name, reader in self.DATA_ATTRS
+                                if attr_name in connected_attr_names]
+
+    def read_attrs(self, data, attrs):
+        values = dict((attr_name, getattr(self.plugs[attr_name], reader)()) for attr_name, reader in attrs)
+
+        text_attr_names = self.ATTR_GROUPS[0]
+        if text_attr_names[0] in values:
+            data.text_fields = [values[attr_name] for attr_name in text_attr_names]
+
+        data.camera_name = values.get("camera", data.camera_name)
+        data.counter_padding = values.get("counterPadding", data.counter_padding)
+        data.text_padding = values.get("textPadding", data.text_padding)
+        data.font_name = values.get("fontName", data.font_name)
+        data.font_scale = values.get("fontScale", data.font_scale)
+        data.border_scale = values.get("borderScale", data.border_scale)
+        data.top_border = values.get("topBorder", data.top_border)
+        data.bottom_border = values.get("bottomBorder", data.bottom_border)
+
+        if "fontColorR" in values:
+            data.font_color = om.MColor((values["fontColorR"], values["fontColorG"], values["fontColorB"],
+                                         values["fontAlpha"]))
+        if "borderColorR" in values:
+            data.border_color = om.MColor((values["borderColorR"], values["borderColorG"], values["borderColorB"],
+                                           values["borderAlpha"]))
+
     def get_mask_width_height(self, camera_path, vp_width, vp_height):
         camera_fn = om.MFnCamera(camera_path)
 
@@ -248,40 +755,21 @@ class ShotMaskDrawOverride(omr.MPxDrawOverride):
         if not (data and isinstance(data, ShotMaskData)):
             return
 
-        vp_half_width = 0.5 * data.vp_width
-        vp_half_height = 0.5 * data.vp_height
-
-        mask_half_width = 0.5 * data.mask_width
-        mask_x = vp_half_width - mask_half_width
-
-        mask_half_height = 0.5 * data.mask_height
-        mask_bottom_y = vp_half_height - mask_half_height
-        mask_top_y = vp_half_height + mask_half_height
-
-        border_height = int(0.05 * data.mask_height * data.border_scale)
-
-        background_size = (int(data.mask_width), border_height)
-
-        font_size = int(0.85 * border_height * data.font_scale)
+        layout = data.layout
 
         draw_manager.beginDrawable()
 
         if data.top_border:
-            self.draw_border(draw_manager, om.MPoint(mask_x, mask_top_y - border_height, 0.1), background_size, data.border_color)
+            self.draw_border(draw_manager, layout.top_border_position, layout.background_size, data.border_color)
         if data.bottom_border:
-            self.draw_border(draw_manager, om.MPoint(mask_x, mask_bottom_y, 0.1), background_size, data.border_color)
+            self.draw_border(draw_manager, layout.bottom_border_position, layout.background_size, data.border_color)
 
         draw_manager.setFontName(data.font_name)
-        draw_manager.setFontSize(font_size)
+        draw_manager.setFontSize(layout.font_size)
         draw_manager.setColor(data.font_color)
 
-        self.draw_label(draw_manager, om.MPoint(mask_x + data.text_padding, mask_top_y - border_height, 0.0), data, 0, omr.MUIDrawManager.kLeft, background_size)
-        self.draw_label(draw_manager, om.MPoint(vp_half_width, mask_top_y - border_height, 0.0), data, 1, omr.MUIDrawManager.kCenter, background_size)
-        self.draw_label(draw_manager, om.MPoint(mask_x + data.mask_width - data.text_padding, mask_top_y - border_height, 0.0), data, 2, omr.MUIDrawManager.kRight, background_size)
-
-        self.draw_label(draw_manager, om.MPoint(mask_x + data.text_padding, mask_bottom_y, 0.0), data, 3, omr.MUIDrawManager.kLeft, background_size)
-        self.draw_label(draw_manager, om.MPoint(vp_half_width, mask_bottom_y, 0.0), data, 4, omr.MUIDrawManager.kCenter, background_size)
-        self.draw_label(draw_manager, om.MPoint(mask_x + data.mask_width - data.text_padding, mask_bottom_y, 0.0), data, 5, omr.MUIDrawManager.kRight, background_size)
+        for i, (position, alignment) in enumerate(layout.label_anchors):
+            self.draw_label(draw_manager, position, data, i, alignment, layout.background_size)
 
         draw_manager.endDrawable()
 
@@ -295,15 +783,7 @@ class ShotMaskDrawOverride(omr.MPxDrawOverride):
             draw_manager.text2d(position, text, alignment=alignment, backgroundSize=background_size, backgroundColor=om.MColor((0.0, 0.0, 0.0, 0.0)))
 
     def camera_exists(self, name):
-        dg_iter = om.MItDependencyNodes(om.MFn.kCamera)
-        while not dg_iter.isDone():
-            camera_path = om.MDagPath.getAPathTo(dg_iter.thisNode())
-            if self.is_camera_match(camera_path, name):
-                return True
-
-            dg_iter.next()
-
-        return False
+        return CameraNameIndex.contains(name)
 
     def is_camera_match(self, camera_path, name):
         if self.get_camera_transform_name(camera_path) == name or self.get_camera_shape_name(camera_path) == name:
@@ -326,7 +806,7 @@ class ShotMaskDrawOverride(omr.MPxDrawOverride):
         return ""
 
     def parse_text(self, orig_text, camera_path, data):
-        text = orig_text
+        text = ShotMaskTokens.evaluate(orig_text, camera_path, data)
 
         return {"text": text}
 
@@ -337,6 +817,213 @@ class ShotMaskDrawOverride(omr.MPxDrawOverride):
         return ShotMaskDrawOverride(obj)
 
 
+class ShotMaskProfiler(object):
+    """
+    Opt-in timing of the draw path, per node, panel and method, kept in fixed size ring buffers.
+
+    Enabling swaps the timed ShotMaskDrawOverride methods for timing wrappers and disabling puts the originals
+    back, so nothing is added to the draw path while profiling is off.
+    """
+
+    TIMED_METHODS = ["prepareForDraw", "get_mask_width_height", "camera_exists", "addUIDrawables"]
+    # methods that set the node and panel the other methods are timed under, obj_path and frame_context args
+    CONTEXT_METHODS = ["prepareForDraw", "addUIDrawables"]
+
+    BUFFER_SIZE = 1000
+
+    enabled = False
+    original_methods = {}
+
+    # (node, panel, method) to a ring buffer of (start, duration) in seconds
+    timings = {}
+    context = ("", "")
+    start_time = 0.0
+
+    @classmethod
+    def enable(cls):
+        if ShotMaskProfiler.enabled:
+            return
+
+        for method_name in cls.TIMED_METHODS:
+            method = ShotMaskDrawOverride.__dict__[method_name]
+            ShotMaskProfiler.original_methods[method_name] = method
+            setattr(ShotMaskDrawOverride, method_name, cls.create_timed_method(method_name, method))
+
+        if not ShotMaskProfiler.timings:
+            ShotMaskProfiler.start_time = time.perf_counter()
+
+        ShotMaskProfiler.enabled = True
+
+    @classmethod
+    def disable(cls):
+        if not ShotMaskProfiler.enabled:
+            return
+
+        for method_name, method in ShotMaskProfiler.original_methods.items():
+            setattr(ShotMaskDrawOverride, method_name, method)
+
+        ShotMaskProfiler.original_methods = {}
+        ShotMaskProfiler.enabled = False
+
+    @classmethod
+    def reset(cls):
+        ShotMaskProfiler.timings = {}
+        ShotMaskProfiler.start_time = time.perf_counter()
+
+    @classmethod
+    def create_timed_method(cls, method_name, method):
+        sets_context = method_name in cls.CONTEXT_METHODS
+
+        def timed_method(self, *args):
+            if sets_context:
+                ShotMaskProfiler.context = (args[0].partialPathName(), cls.get_panel_name(args[2]))
+
+            start_time = time.perf_counter()
+            try:
+                return method(self, *args)
+            finally:
+                cls.record(method_name, start_time, time.perf_counter() - start_time)
+
+        return timed_method
+
+    @classmethod
+    def get_panel_name(cls, frame_context):
+        try:
+            return frame_context.renderingDestination()[1]
+        except Exception:
+            return ""
+
+    @classmethod
+    def record(cls, method_name, start_time, duration):
+        key = ShotMaskProfiler.context + (method_name,)
+
+        timings = ShotMaskProfiler.timings.get(key)
+        if timings is None:
+            timings = collections.deque(maxlen=cls.BUFFER_SIZE)
+            ShotMaskProfiler.timings[key] = timings
+
+        timings.append((start_time, duration))
+
+    @classmethod
+    def get_percentile(cls, sorted_values, percentile):
+        # nearest rank
+        return sorted_values[max(0, int(math.ceil(percentile * len(sorted_values))) - 1)]
+
+    @classmethod
+    def get_stats(cls):
+        """
+        :return: list of (node, panel, method, call count, p50, p95, max), durations in milliseconds
+        """
+        stats = []
+        for (node, panel, method_name), timings in sorted(ShotMaskProfiler.timings.items()):
+            durations = sorted(duration * 1000.0 for _, duration in timings)
+            if durations:
+                stats.append((node, panel, method_name, len(durations), cls.get_percentile(durations, 0.5),
+                              cls.get_percentile(durations, 0.95), durations[-1]))
+
+        return stats
+
+    @classmethod
+    def export_chrome_trace(cls, path):
+        """
+        Writes the recorded calls as Chrome trace events (chrome://tracing, Perfetto), one row per node and panel.
+        """
+        pid = os.getpid()
+        thread_ids = {}
+
+        events = []
+        for (node, panel, method_name), timings in sorted(ShotMaskProfiler.timings.items()):
+            tid = thread_ids.get((node, panel))
+            if tid is None:
+                tid = len(thread_ids) + 1
+                thread_ids[(node, panel)] = tid
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                               "args": {"name": "{0} ({1})".format(node, panel or "unknown panel")}})
+
+            for start_time, duration in timings:
+                events.append({"name": method_name, "cat": "shotMask", "ph": "X", "pid": pid, "tid": tid,
+                               "ts": (start_time - ShotMaskProfiler.start_time) * 1000000.0,
+                               "dur": duration * 1000000.0})
+
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+        return len(events) - len(thread_ids)
+
+
+class ShotMaskProfileCmd(om.MPxCommand):
+    """
+    Controls the draw path profiler and reports its timings:
+
+        shotMaskProfile -enable true
+        shotMaskProfile            // p50, p95 and max per node, panel and method
+        shotMaskProfile -export "C:/temp/shot_mask_trace.json"
+        shotMaskProfile -enable false -reset
+    """
+    COMMAND_NAME = "shotMaskProfile"
+
+    ENABLE_FLAG = ["-e", "-enable", om.MSyntax.kBoolean]
+    RESET_FLAG = ["-r", "-reset"]
+    EXPORT_FLAG = ["-ex", "-export", om.MSyntax.kString]
+
+    def __init__(self):
+        super(ShotMaskProfileCmd, self).__init__()
+
+    def doIt(self, arg_list):
+        try:
+            arg_db = om.MArgDatabase(self.syntax(), arg_list)
+        except:
+            self.displayError("Error parsing arguments")
+            raise
+
+        if arg_db.isQuery:
+            if arg_db.isFlagSet(ShotMaskProfileCmd.ENABLE_FLAG[0]):
+                self.setResult(ShotMaskProfiler.enabled)
+                return
+            raise RuntimeError("Flag does not support query")
+
+        report = True
+        if arg_db.isFlagSet(ShotMaskProfileCmd.EXPORT_FLAG[0]):
+            path = arg_db.flagArgumentString(ShotMaskProfileCmd.EXPORT_FLAG[0], 0)
+            event_count = ShotMaskProfiler.export_chrome_trace(path)
+            self.setResult("Exported {0} events: {1}".format(event_count, path))
+            report = False
+
+        if arg_db.isFlagSet(ShotMaskProfileCmd.RESET_FLAG[0]):
+            ShotMaskProfiler.reset()
+            report = False
+
+        if arg_db.isFlagSet(ShotMaskProfileCmd.ENABLE_FLAG[0]):
+            if arg_db.flagArgumentBool(ShotMaskProfileCmd.ENABLE_FLAG[0], 0):
+                ShotMaskProfiler.enable()
+            else:
+                ShotMaskProfiler.disable()
+            report = False
+
+        if report:
+            self.setResult(["{0} {1} {2}: {3} calls, p50 {4:.3f} ms, p95 {5:.3f} ms, max {6:.3f} ms".format(*stats)
+                            for stats in ShotMaskProfiler.get_stats()])
+
+    def isUndoable(self):
+        return False
+
+    @classmethod
+    def creator(cls):
+        return ShotMaskProfileCmd()
+
+    @classmethod
+    def create_syntax(cls):
+        syntax = om.MSyntax()
+
+        syntax.enableQuery = True
+
+        syntax.addFlag(*cls.ENABLE_FLAG)
+        syntax.addFlag(*cls.RESET_FLAG)
+        syntax.addFlag(*cls.EXPORT_FLAG)
+
+        return syntax
+
+
 def initializePlugin(obj):
     """
     """
@@ -359,12 +1046,33 @@ def initializePlugin(obj):
     except:
         om.MGlobal.displayError("Failed to register draw override: {0}".format(ShotMaskDrawOverride.NAME))
 
+    try:
+        plugin_fn.registerCommand(ShotMaskProfileCmd.COMMAND_NAME, ShotMaskProfileCmd.creator,
+                                  ShotMaskProfileCmd.create_syntax)
+    except:
+        om.MGlobal.displayError("Failed to register command: {0}".format(ShotMaskProfileCmd.COMMAND_NAME))
+
+    CameraNameIndex.add_callbacks()
+    ShotMaskTokens.add_callbacks()
+    ShotMaskLayoutCache.add_callbacks()
+
 
 def uninitializePlugin(obj):
     """
     """
     plugin_fn = om.MFnPlugin(obj)
 
+    ShotMaskProfiler.disable()
+
+    try:
+        plugin_fn.deregisterCommand(ShotMaskProfileCmd.COMMAND_NAME)
+    except:
+        om.MGlobal.displayError("Failed to deregister command: {0}".format(ShotMaskProfileCmd.COMMAND_NAME))
+
+    CameraNameIndex.remove_callbacks()
+    ShotMaskTokens.remove_callbacks()
+    ShotMaskLayoutCache.remove_callbacks()
+
     try:
         omr.MDrawRegistry.deregisterDrawOverrideCreator(ShotMaskLocator.DRAW_DB_CLASSIFICATION,
                                                         ShotMaskLocator.DRAW_REGISTRANT_ID)
@@ -5,65 +5,75 @@ import maya.OpenMayaUI as omui
 
 from PySide2 import QtWidgets, QtCore
 from shiboken2 import wrapInstance
+import time
 import traceback
 
+from RetimingTool import retiming_commands
+from RetimingTool.key_pruning import find_redundant_keys
+from RetimingTool.retiming_planner import build_merged_retime_plan, build_remap_plan
+from RetimingTool.time_warp import TIME_WARPS, SplineTimeWarp, parse_spline_points, warp_keyframe_times
+
+
 class RetimingUtils(object):
 
     @classmethod
     def retime_keys(cls, retime_value, incremental, move_to_next):
         range_start_time, range_end_time = cls.get_selected_range()
-        start_keyframe_time = cls.get_start_keyframe_time(range_start_time)
-        last_keyframe_time = cls.get_last_keyframe_time()
-        current_time = start_keyframe_time
+        retime_plan = cls.plan_retime(range_start_time, range_end_time, retime_value, incremental, move_to_next)
+        if not retime_plan.keyframe_times:
+            return
 
-        new_keyframe_times = [start_keyframe_time]
+        cls.apply_retime_plan(retime_plan)
+        cls.set_current_time(retime_plan.current_time)
 
-        while current_time != last_keyframe_time:
-            next_keyframe_time = cls.find_keyframe("next", current_time)
+    @classmethod
+    def retime_keys_merged(cls, retimes):
+        """
+        Applies a burst of retimes over the selected range as a single edit, with the same result as calling
+        retime_keys once per retime.
 
-            if incremental:
-                time_diff = next_keyframe_time - current_time
-                if current_time < range_end_time:
-                    time_diff += retime_value
-                    if time_diff < 1:
-                        time_diff = 1
-            else:
-                if current_time < range_end_time:
-                    time_diff = retime_value
-                else:
-                    time_diff = next_keyframe_time - current_time
+        :param retimes: list of (retime_value, incremental), in the order they were made
+        """
+        range_start_time, range_end_time = cls.get_selected_range()
+        retime_plan = build_merged_retime_plan(cls.get_keyframe_times(), range_start_time, range_end_time, retimes)
+        if not retime_plan.keyframe_times:
+            return
 
-            new_keyframe_times.append(new_keyframe_times[-1] + time_diff)
-            current_time = next_keyframe_time
+        cls.apply_retime_plan(retime_plan)
+        cls.set_current_time(retime_plan.current_time)
 
-        if len(new_keyframe_times) > 1:
-            cls.retime_keys_recursive(start_keyframe_time, 0, new_keyframe_times)
+    @classmethod
+    def retime_range(cls, range_start_time, range_end_time, retime_value, incremental):
+        """
+        Retimes the keys of the selected objects without relying on the time slider, so it can also run headless.
 
-        first_keyframe_time = cls.find_keyframe("first")
-
-        if move_to_next and range_start_time >= first_keyframe_time:
-            next_keyframe_time = cls.find_keyframe("next", start_keyframe_time)
-            cls.set_current_time(next_keyframe_time)
-        elif range_end_time > first_keyframe_time:
-            cls.set_current_time(start_keyframe_time)
-        else:
-            cls.set_current_time(range_start_time)
+        :return: the RetimePlan that was applied
+        """
+        retime_plan = retiming_commands.retime_range(cmds, mel, range_start_time, range_end_time, retime_value,
+                                                     incremental)
+        return retime_plan
 
     @classmethod
-    def retime_keys_recursive(cls, current_time, index, new_keyframe_times):
-        if index >= len(new_keyframe_times):
-            return
-
-        updated_keyframe_time = new_keyframe_times[index]
+    def time_warp_keys(cls, time_warp, snap_to_frames=False):
+        """
+        Remaps the keys inside the selected range through a time warp, the range ends stay where they are.
+        """
+        range_start_time, range_end_time = cls.get_selected_range()
+        keyframe_times = cls.get_keyframe_times()
 
-        next_keyframe_time = cls.find_keyframe("next", current_time)
+        new_keyframe_times = warp_keyframe_times(keyframe_times, range_start_time, range_end_time, time_warp,
+                                                 snap_to_frames)
+        retime_plan = build_remap_plan(keyframe_times, new_keyframe_times)
+        if retime_plan.keyframe_moves:
+            cls.apply_retime_plan(retime_plan)
 
-        if updated_keyframe_time < next_keyframe_time:
-            cls.change_keyframe_time(current_time, updated_keyframe_time)
-            cls.retime_keys_recursive(next_keyframe_time, index + 1, new_keyframe_times)
-        else:
-            cls.retime_keys_recursive(next_keyframe_time, index + 1, new_keyframe_times)
-            cls.change_keyframe_time(current_time, updated_keyframe_time)
+    @classmethod
+    def plan_retime(cls, range_start_time, range_end_time, retime_value, incremental, move_to_next=False):
+        """
+        Builds the retime plan for the selected objects without changing the scene.
+        """
+        return retiming_commands.plan_retime(cmds, range_start_time, range_end_time, retime_value, incremental,
+                                             move_to_next)
 
     @classmethod
     def set_current_time(cls, time):
@@ -84,8 +94,19 @@ class RetimingUtils(object):
         return cmds.findKeyframe(**kwargs)
 
     @classmethod
-    def change_keyframe_time(cls, current_time, new_time):
-        cmds.keyframe(e=True, time=(current_time, new_time), timeChange=new_time)
+    def apply_retime_plan(cls, retime_plan):
+        retiming_commands.apply_retime_plan(mel, retime_plan)
+
+    @classmethod
+    def get_keyframe_times(cls):
+        """
+        :return: sorted, unique key times of the selected objects, queried from the scene
+        """
+        return sorted(set(cls.query_keyframe_times()))
+
+    @classmethod
+    def query_keyframe_times(cls):
+        return retiming_commands.query_keyframe_times(cmds)
 
     @classmethod
     def get_start_keyframe_time(cls, range_start_time):
@@ -101,6 +122,89 @@ class RetimingUtils(object):
         return cls.find_keyframe("last")
 
 
+class RetimingCommandUtils(RetimingUtils):
+    """
+    Retimes through the RetimeCmd plugin command, which keeps a retime as a single compact undo entry.
+    """
+
+    PLUGIN_NAME = "retime_cmd.py"
+
+    @classmethod
+    def retime_keys(cls, retime_value, incremental, move_to_next):
+        range_start_time, range_end_time = cls.get_selected_range()
+        cls.run_retime_cmd(range_start_time, range_end_time, retime_value, incremental, move_to_next)
+
+    @classmethod
+    def retime_keys_merged(cls, retimes):
+        # RetimeCmd plans each retime itself, so a burst runs one command per retime
+        range_start_time, range_end_time = cls.get_selected_range()
+        for retime_value, incremental in retimes:
+            cls.run_retime_cmd(range_start_time, range_end_time, retime_value, incremental, False)
+
+    @classmethod
+    def retime_range(cls, range_start_time, range_end_time, retime_value, incremental):
+        """
+        The command plans the retime itself, so no RetimePlan is returned.
+
+        :return: number of anim curves the command retimed
+        """
+        return cls.run_retime_cmd(range_start_time, range_end_time, retime_value, incremental, False)
+
+    @classmethod
+    def run_retime_cmd(cls, range_start_time, range_end_time, retime_value, incremental, move_to_next):
+        if not cmds.pluginInfo(cls.PLUGIN_NAME, q=True, loaded=True):
+            cmds.loadPlugin(cls.PLUGIN_NAME)
+
+        result = cmds.RetimeCmd(retime=retime_value, incremental=incremental, startTime=range_start_time,
+                                endTime=range_end_time, moveToNext=move_to_next)
+        return result
+
+
+class KeyPruningUtils(object):
+
+    DEFAULT_TOLERANCE = 0.001
+
+    @classmethod
+    def prune_keys(cls, tolerance=DEFAULT_TOLERANCE):
+        """
+        Removes the keys of the selected objects that lie on the line between their neighbours.
+
+        :return: number of keys removed per anim curve
+        """
+        start_time = time.time()
+
+        removed_key_counts = {}
+        for anim_curve_name in cmds.keyframe(q=True, name=True) or []:
+            keyframe_times = cmds.keyframe(anim_curve_name, q=True, timeChange=True)
+            keyframe_values = cmds.keyframe(anim_curve_name, q=True, valueChange=True)
+
+            redundant_indices = find_redundant_keys(keyframe_times, keyframe_values, tolerance)
+            if len(redundant_indices):
+                cmds.cutKey(anim_curve_name, index=cls.get_index_ranges(redundant_indices), clear=True)
+
+            removed_key_counts[anim_curve_name] = len(redundant_indices)
+
+        for anim_curve_name in sorted(removed_key_counts):
+            om.MGlobal.displayInfo("{0}: {1} keys removed".format(anim_curve_name, removed_key_counts[anim_curve_name]))
+        om.MGlobal.displayInfo("Pruned {0} keys from {1} curves in {2:.3f}s".format(
+            sum(removed_key_counts.values()), len(removed_key_counts), time.time() - start_time))
+
+        return removed_key_counts
+
+    @classmethod
+    def get_index_ranges(cls, indices):
+        # consecutive indices are grouped so each run is removed as one range
+        index_ranges = []
+        for index in indices:
+            index = int(index)
+            if index_ranges and index_ranges[-1][1] == index - 1:
+                index_ranges[-1] = (index_ranges[-1][0], index)
+            else:
+                index_ranges.append((index, index))
+
+        return index_ranges
+
+
 class RetimingUI(QtWidgets.QDialog):
 
     WINDOW_TITLE = "Retiming Tool"
@@ -109,6 +213,11 @@ class RetimingUI(QtWidgets.QDialog):
     RELATIVE_BUTTON_WIDTH = 65
     RETIMING_PROPERTY_NAME = "retiming_data"
 
+    # clicks arriving within this many milliseconds of each other are merged into one retime
+    MERGE_CLICKS_INTERVAL = 300
+
+    BACKENDS = [("Commands", RetimingUtils), ("API 2.0", RetimingCommandUtils)]
+
     dlg_instance = None
 
     @classmethod
@@ -157,6 +266,36 @@ class RetimingUI(QtWidgets.QDialog):
 
         self.move_to_next_cb = QtWidgets.QCheckBox("Move to Next Frame")
 
+        self.time_warp_cmb = QtWidgets.QComboBox()
+        for time_warp_name, time_warp in TIME_WARPS:
+            self.time_warp_cmb.addItem(time_warp_name)
+        self.time_warp_cmb.addItem("Custom Spline")
+
+        self.time_warp_points_le = QtWidgets.QLineEdit("0,0 0.5,0.75 1,1")
+        self.time_warp_points_le.setToolTip("Spline points as u,warped_u pairs separated by spaces")
+        self.time_warp_points_le.setEnabled(False)
+
+        self.time_warp_snap_cb = QtWidgets.QCheckBox("Snap")
+        self.time_warp_btn = QtWidgets.QPushButton("Warp")
+
+        self.prune_tolerance_sb = QtWidgets.QDoubleSpinBox()
+        self.prune_tolerance_sb.setDecimals(4)
+        self.prune_tolerance_sb.setSingleStep(0.001)
+        self.prune_tolerance_sb.setValue(KeyPruningUtils.DEFAULT_TOLERANCE)
+        self.prune_btn = QtWidgets.QPushButton("Prune Keys")
+
+        self.merge_clicks_cb = QtWidgets.QCheckBox("Merge Rapid Clicks")
+        self.merge_clicks_cb.setChecked(True)
+
+        self.pending_retimes = []
+        self.pending_retime_timer = QtCore.QTimer(self)
+        self.pending_retime_timer.setSingleShot(True)
+        self.pending_retime_timer.setInterval(self.MERGE_CLICKS_INTERVAL)
+
+        self.backend_cmb = QtWidgets.QComboBox()
+        for backend_name, backend_cls in self.BACKENDS:
+            self.backend_cmb.addItem(backend_name)
+
     def create_layouts(self):
         absolute_retiming_layout = QtWidgets.QHBoxLayout()
         absolute_retiming_layout.setSpacing(2)
@@ -170,12 +309,29 @@ class RetimingUI(QtWidgets.QDialog):
             if relative_retiming_layout.count() == 2:
                 relative_retiming_layout.addStretch()
 
+        time_warp_layout = QtWidgets.QHBoxLayout()
+        time_warp_layout.setSpacing(2)
+        time_warp_layout.addWidget(self.time_warp_cmb)
+        time_warp_layout.addWidget(self.time_warp_points_le)
+        time_warp_layout.addWidget(self.time_warp_snap_cb)
+        time_warp_layout.addWidget(self.time_warp_btn)
+
+        prune_layout = QtWidgets.QHBoxLayout()
+        prune_layout.setSpacing(2)
+        prune_layout.addWidget(QtWidgets.QLabel("Tolerance:"))
+        prune_layout.addWidget(self.prune_tolerance_sb)
+        prune_layout.addWidget(self.prune_btn)
+
         main_layout = QtWidgets.QVBoxLayout(self)
         main_layout.setContentsMargins(2, 2, 2, 2)
         main_layout.setSpacing(2)
         main_layout.addLayout(absolute_retiming_layout)
         main_layout.addLayout(relative_retiming_layout)
+        main_layout.addLayout(time_warp_layout)
+        main_layout.addLayout(prune_layout)
         main_layout.addWidget(self.move_to_next_cb)
+        main_layout.addWidget(self.merge_clicks_cb)
+        main_layout.addWidget(self.backend_cmb)
 
 
     def create_connections(self):
@@ -185,19 +341,98 @@ class RetimingUI(QtWidgets.QDialog):
         for btn in self.relative_buttons:
             btn.clicked.connect(self.retime)
 
+        self.time_warp_cmb.currentIndexChanged.connect(self.update_time_warp_points_enabled)
+        self.time_warp_btn.clicked.connect(self.time_warp)
+        self.prune_btn.clicked.connect(self.prune_keys)
+
+        self.pending_retime_timer.timeout.connect(self.apply_pending_retime)
+
     def retime(self):
         btn = self.sender()
         if btn:
             retiming_data = btn.property(self.RETIMING_PROPERTY_NAME)
             move_to_next = self.move_to_next_cb.isChecked()
 
-            cmds.undoInfo(openChunk=True)
-            try:
-                RetimingUtils.retime_keys(retiming_data[0], retiming_data[1], move_to_next)
-            except:
-                traceback.print_exc()
-                om.MGlobal.displayError("Retime error occurred. See script editor for details.")
-            cmds.undoInfo(closeChunk=True)
+            # moving to the next frame changes the range every click, so those clicks can't be merged
+            if self.merge_clicks_cb.isChecked() and not move_to_next:
+                self.pending_retimes.append((retiming_data[0], retiming_data[1]))
+                self.pending_retime_timer.start()
+            else:
+                self.apply_pending_retime()
+                self.run_retime(retiming_data[0], retiming_data[1], move_to_next)
+
+    def apply_pending_retime(self):
+        self.pending_retime_timer.stop()
+
+        pending_retimes = self.pending_retimes
+        self.pending_retimes = []
+
+        if len(pending_retimes) == 1:
+            self.run_retime(pending_retimes[0][0], pending_retimes[0][1], False)
+        elif pending_retimes:
+            self.run_merged_retime(pending_retimes)
+
+    def run_retime(self, retime_value, incremental, move_to_next):
+        retiming_utils = self.get_retiming_utils()
+
+        cmds.undoInfo(openChunk=True)
+        try:
+            retiming_utils.retime_keys(retime_value, incremental, move_to_next)
+        except:
+            traceback.print_exc()
+            om.MGlobal.displayError("Retime error occurred. See script editor for details.")
+        cmds.undoInfo(closeChunk=True)
+
+    def run_merged_retime(self, retimes):
+        retiming_utils = self.get_retiming_utils()
+
+        cmds.undoInfo(openChunk=True)
+        try:
+            retiming_utils.retime_keys_merged(retimes)
+        except:
+            traceback.print_exc()
+            om.MGlobal.displayError("Retime error occurred. See script editor for details.")
+        cmds.undoInfo(closeChunk=True)
+
+    def update_time_warp_points_enabled(self):
+        self.time_warp_points_le.setEnabled(self.time_warp_cmb.currentIndex() >= len(TIME_WARPS))
+
+    def time_warp(self):
+        self.apply_pending_retime()
+
+        retiming_utils = self.get_retiming_utils()
+
+        cmds.undoInfo(openChunk=True)
+        try:
+            time_warp_index = self.time_warp_cmb.currentIndex()
+            if time_warp_index < len(TIME_WARPS):
+                time_warp = TIME_WARPS[time_warp_index][1]
+            else:
+                time_warp = SplineTimeWarp(parse_spline_points(self.time_warp_points_le.text()))
+
+            retiming_utils.time_warp_keys(time_warp, self.time_warp_snap_cb.isChecked())
+        except:
+            traceback.print_exc()
+            om.MGlobal.displayError("Time warp error occurred. See script editor for details.")
+        cmds.undoInfo(closeChunk=True)
+
+    def prune_keys(self):
+        self.apply_pending_retime()
+
+        cmds.undoInfo(openChunk=True)
+        try:
+            KeyPruningUtils.prune_keys(self.prune_tolerance_sb.value())
+        except:
+            traceback.print_exc()
+            om.MGlobal.displayError("Key pruning error occurred. See script editor for details.")
+        cmds.undoInfo(closeChunk=True)
+
+    def get_retiming_utils(self):
+        return self.BACKENDS[self.backend_cmb.currentIndex()][1]
+
+    def hideEvent(self, event):
+        self.apply_pending_retime()
+        super(RetimingUI, self).hideEvent(event)
 
 
 if __name__ == "__main__":
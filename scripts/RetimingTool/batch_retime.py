@@ -0,0 +1,205 @@
+"""
+Headless batch retiming of many shot files.
+
+The manifest is a JSON file listing the scene files and the retimes to apply to them:
+
+    {
+        "retimes": [{"range": [1001, 1050], "value": 1, "incremental": true}],
+        "files": [
+            "shots/sh010.ma",
+            {"path": "shots/sh020.ma", "output": "shots/sh020_retimed.ma", "retimes": [...]}
+        ]
+    }
+
+Top level retimes are used for every file that does not list its own. A retime may also name the "nodes" whose
+keys it affects, otherwise every anim curve in the scene is retimed.
+
+Each file is processed by its own mayapy worker process, run in parallel across a pool:
+
+    mayapy -m RetimingTool.batch_retime manifest.json --workers 4 --log-dir logs
+
+--dry-run runs the same manifest through a stand-in worker that only writes the logs, without starting mayapy.
+
+The manifest code does not import Maya. The worker pool is shared with the playblast queue, see mayapy_workers.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import mayapy_workers
+
+
+class RetimeJob(mayapy_workers.WorkerJob):
+
+    def __init__(self, path, retimes, output=None):
+        super(RetimeJob, self).__init__(path)
+
+        self.path = path
+        self.retimes = retimes
+        self.output = output
+
+    def to_dict(self):
+        return {"path": self.path, "retimes": self.retimes, "output": self.output}
+
+    @classmethod
+    def from_dict(cls, job_data):
+        return RetimeJob(job_data["path"], job_data["retimes"], job_data.get("output"))
+
+
+def validate_retime(retime):
+    if "range" not in retime or len(retime["range"]) != 2:
+        raise ValueError("Retime requires a [start, end] range: {0}".format(retime))
+    if "value" not in retime:
+        raise ValueError("Retime requires a value: {0}".format(retime))
+
+    retime.setdefault("incremental", True)
+    if not retime["incremental"] and retime["value"] < 1:
+        raise ValueError("Absolute retimes require a value of at least 1: {0}".format(retime))
+
+    return retime
+
+
+def load_manifest(manifest_path):
+    return mayapy_workers.load_manifest(manifest_path, parse_manifest)
+
+
+def parse_manifest(manifest, base_dir=""):
+    default_retimes = manifest.get("retimes", [])
+
+    jobs = []
+    for file_entry in manifest.get("files", []):
+        if isinstance(file_entry, str):
+            file_entry = {"path": file_entry}
+
+        retimes = [validate_retime(dict(retime)) for retime in file_entry.get("retimes", default_retimes)]
+        if not retimes:
+            raise ValueError("No retimes set for file: {0}".format(file_entry["path"]))
+
+        path = os.path.join(base_dir, file_entry["path"])
+        output = file_entry.get("output")
+        if output:
+            output = os.path.join(base_dir, output)
+
+        jobs.append(RetimeJob(path, retimes, output))
+
+    return jobs
+
+
+def get_log_path(log_dir, job, index):
+    filename = os.path.splitext(os.path.basename(job.path))[0]
+    return os.path.join(log_dir, "{0:03d}_{1}.log".format(index, filename))
+
+
+def run_jobs(jobs, worker, worker_count=mayapy_workers.DEFAULT_WORKER_COUNT, log_dir="retime_logs", on_result=None):
+    """
+    Runs every job once through the worker across a pool of worker_count processes.
+
+    :param worker: callable taking (job, log_path) and returning an exit code
+    :param on_result: optional callable receiving each job as it completes
+    :return: jobs
+    """
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    pending_jobs = list(enumerate(jobs))
+
+    def get_next_job():
+        if not pending_jobs:
+            return None
+
+        index, job = pending_jobs.pop(0)
+        job.attempts += 1
+        job.log_path = get_log_path(log_dir, job, index)
+        return job, job.log_path
+
+    def on_job_finished(job, log_path, return_code, duration):
+        job.return_code = return_code
+        job.duration += duration
+        if on_result:
+            on_result(job)
+
+    mayapy_workers.run_pool(worker, worker_count, get_next_job, on_job_finished)
+
+    return jobs
+
+
+def get_worker(mayapy_path=mayapy_workers.DEFAULT_MAYAPY):
+    # RetimingTool sits next to mayapy_workers, whose directory is always on the worker PYTHONPATH
+    return mayapy_workers.MayapyWorker(["-m", "RetimingTool.batch_retime"], mayapy_path=mayapy_path)
+
+
+def retime_file(job):
+    """
+    Applies the job retimes to a scene file. Only called inside a mayapy worker process.
+    """
+    import maya.standalone
+    maya.standalone.initialize()
+
+    import maya.cmds as cmds
+    from RetimingTool.RetimingTool import RetimingUtils
+
+    try:
+        cmds.file(job.path, open=True, force=True)
+
+        for retime in job.retimes:
+            nodes = retime.get("nodes") or cmds.ls(type="animCurve")
+            if not nodes:
+                print("No anim curves to retime in: {0}".format(job.path))
+                continue
+
+            cmds.select(nodes, replace=True)
+
+            range_start_time, range_end_time = retime["range"]
+            retime_plan = RetimingUtils.retime_range(range_start_time, range_end_time, retime["value"],
+                                                     retime["incremental"])
+            print("Moved {0} keys: {1}".format(len(retime_plan.keyframe_moves), retime))
+
+        cmds.select(clear=True)
+
+        if job.output:
+            cmds.file(rename=job.output)
+        cmds.file(save=True, force=True)
+        print("Saved: {0}".format(cmds.file(q=True, sceneName=True)))
+    finally:
+        maya.standalone.uninitialize()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply retimes to many scene files with a pool of mayapy workers.")
+    parser.add_argument("manifest", nargs="?", help="JSON manifest of files and retimes")
+    parser.add_argument("-w", "--workers", type=int, default=mayapy_workers.DEFAULT_WORKER_COUNT,
+                        help="number of parallel workers")
+    parser.add_argument("-l", "--log-dir", default="retime_logs", help="directory for the per-file logs")
+    parser.add_argument("--mayapy", default=mayapy_workers.DEFAULT_MAYAPY, help="path to the mayapy executable")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="check the manifest and run the pool with a stand-in worker instead of mayapy")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        retime_file(RetimeJob.from_dict(json.loads(args.worker)))
+        return 0
+
+    if not args.manifest:
+        parser.error("a manifest is required")
+
+    jobs = load_manifest(args.manifest)
+
+    def on_result(job):
+        print("[{0}] {1}".format("OK" if job.succeeded() else "FAILED", job.path))
+
+    if args.dry_run:
+        worker = mayapy_workers.FakeWorker()
+    else:
+        worker = get_worker(args.mayapy)
+
+    run_jobs(jobs, worker, args.workers, args.log_dir, on_result)
+    mayapy_workers.print_summary(jobs, "{0} files retimed, {1} failed")
+
+    return 0 if all(job.succeeded() for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def find_redundant_keys(keyframe_times, keyframe_values, tolerance):
+    """
+    :param keyframe_times: sorted key times of one curve
+    :param keyframe_values: key value for every key time
+    :param tolerance: largest allowed distance between a removed key and the line through the kept keys
+    :return: NumPy array of the indices of keys that can be removed. The first and last key are always kept.
+    """
+    times = np.asarray(keyframe_times, dtype=np.float64)
+    values = np.asarray(keyframe_values, dtype=np.float64)
+
+    keep = np.ones(len(times), dtype=bool)
+    if len(times) < 3:
+        return np.flatnonzero(~keep)
+
+    while True:
+        kept_indices = np.flatnonzero(keep)
+        if len(kept_indices) < 3:
+            break
+
+        prev_indices = kept_indices[:-2]
+        indices = kept_indices[1:-1]
+        next_indices = kept_indices[2:]
+
+        removable = get_line_distances(times, values, prev_indices, indices, next_indices) <= tolerance
+        if not removable.any():
+            break
+
+        # neighbouring keys are not removed in the same pass, only every other key of each run of removable keys,
+        # so the line between the survivors is checked again in the next pass
+        positions = np.arange(len(removable))
+        run_starts = removable & ~np.concatenate(([False], removable[:-1]))
+        run_positions = positions - np.maximum.accumulate(np.where(run_starts, positions, 0))
+
+        keep[indices[removable & (run_positions % 2 == 0)]] = False
+
+    # keys removed in earlier passes were checked against lines that later passes may have changed,
+    # so put back any key that ended up too far from the final curve
+    while True:
+        kept_indices = np.flatnonzero(keep)
+        removed_indices = np.flatnonzero(~keep)
+        if not len(removed_indices):
+            break
+
+        distances = np.abs(np.interp(times[removed_indices], times[kept_indices], values[kept_indices]) -
+                           values[removed_indices])
+        out_of_tolerance = removed_indices[distances > tolerance]
+        if not len(out_of_tolerance):
+            break
+
+        keep[out_of_tolerance] = True
+
+    return np.flatnonzero(~keep)
+
+
+def get_line_distances(times, values, prev_indices, indices, next_indices):
+    t0 = times[prev_indices]
+    t2 = times[next_indices]
+    v0 = values[prev_indices]
+    v2 = values[next_indices]
+
+    line_values = v0 + (v2 - v0) * (times[indices] - t0) / (t2 - t0)
+
+    return np.abs(line_values - values[indices])
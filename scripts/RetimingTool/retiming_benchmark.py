@@ -0,0 +1,214 @@
+"""
+Benchmarks the retime plan builder and the apply step at increasing key counts, and checks a merged burst of
+retimes against applying them one after the other.
+
+The benchmark runs the same retiming_commands functions RetimingUtils calls, passing KeyframeStore in place of
+cmds and mel. The store keeps the keys in memory and records every call, so the benchmark runs outside of Maya:
+
+    python -m RetimingTool.retiming_benchmark --keys 100 10000 100000
+
+Maya calls are the round trips RetimingUtils makes (a query, a MEL batch, a currentTime), commands are the
+individual keyframe edits inside those calls. Apply times include the store parsing the MEL batch.
+"""
+
+import argparse
+import re
+import time
+
+from RetimingTool import retiming_commands
+from RetimingTool.retiming_planner import build_merged_retime_plan, build_remap_plan
+from RetimingTool.time_warp import ease_in_out, warp_keyframe_times
+
+
+DEFAULT_KEY_COUNTS = [100, 10000, 100000]
+DEFAULT_CURVE_COUNT = 4
+FIRST_FRAME = 1001
+
+# a burst of clicks as the UI merges them, the -1 clicks are clamped to 1 frame spacing on keys a frame apart
+MERGED_RETIMES = [(1, True), (-1, True), (-1, True), (2, True), (1, True)]
+
+
+class KeyframeStore(object):
+    """
+    Anim curves held as sets of key times, standing in for both cmds and mel on the selected objects of a scene.
+    Only the commands RetimingUtils issues are supported and every call is recorded.
+    """
+
+    MOVE_COMMAND_REGEX = re.compile(r"^keyframe -edit -time (\S+) -timeChange (\S+);$")
+    SHIFT_COMMAND_REGEX = re.compile(r"^keyframe -edit -relative -time \"(\S+):(\S+)\" -timeChange (\S+);$")
+
+    def __init__(self, key_count, curve_count=DEFAULT_CURVE_COUNT):
+        self.calls = []
+        self.command_count = 0
+        self.current_time = FIRST_FRAME
+
+        # every curve is keyed on every frame except the last, which skips every other frame,
+        # so the key times differ between curves
+        self.curves = []
+        for i in range(curve_count):
+            step = 2 if i == curve_count - 1 and curve_count > 1 else 1
+            self.curves.append(set(float(time) for time in range(FIRST_FRAME, FIRST_FRAME + key_count, step)))
+
+    @property
+    def call_count(self):
+        return len(self.calls)
+
+    def reset_counts(self):
+        self.calls = []
+        self.command_count = 0
+
+    def keyframe(self, q=False, timeChange=False):
+        self.calls.append("keyframe")
+        if not q or not timeChange:
+            raise NotImplementedError("Only keyframe queries of timeChange are supported")
+
+        keyframe_times = []
+        for curve in self.curves:
+            keyframe_times.extend(curve)
+
+        return keyframe_times
+
+    def currentTime(self, current_time):
+        self.calls.append("currentTime")
+        self.current_time = current_time
+
+    def eval(self, script):
+        self.calls.append("eval")
+
+        for command in script.splitlines():
+            self.command_count += 1
+
+            match = KeyframeStore.MOVE_COMMAND_REGEX.match(command)
+            if match:
+                self.move_keyframe_time(float(match.group(1)), float(match.group(2)))
+                continue
+
+            match = KeyframeStore.SHIFT_COMMAND_REGEX.match(command)
+            if match:
+                self.shift_keyframe_times(*[float(value) for value in match.groups()])
+                continue
+
+            raise ValueError("Unsupported MEL command: {0}".format(command))
+
+    def move_keyframe_time(self, old_time, new_time):
+        for curve in self.curves:
+            if old_time in curve:
+                if new_time in curve:
+                    raise RuntimeError("Key moved onto an existing key at {0}".format(new_time))
+
+                curve.remove(old_time)
+                curve.add(new_time)
+
+    def shift_keyframe_times(self, first_time, last_time, time_offset):
+        for i, curve in enumerate(self.curves):
+            shifted_times = set(time + time_offset for time in curve if first_time <= time <= last_time)
+            unshifted_times = set(time for time in curve if time < first_time or time > last_time)
+            if shifted_times & unshifted_times:
+                raise RuntimeError("Tail shifted onto existing keys")
+
+            self.curves[i] = shifted_times | unshifted_times
+
+
+class BenchmarkResult(object):
+
+    def __init__(self, operation, key_count, duration, call_count, command_count):
+        self.operation = operation
+        self.key_count = key_count
+        self.duration = duration
+        self.call_count = call_count
+        self.command_count = command_count
+
+    def __str__(self):
+        return "{0:<8} {1:>8} keys  {2:>10.2f} ms  {3:>6} Maya calls  {4:>8} commands".format(
+            self.operation, self.key_count, self.duration * 1000.0, self.call_count, self.command_count)
+
+
+def run_benchmark(key_count, curve_count=DEFAULT_CURVE_COUNT, retime_value=1, incremental=True):
+    """
+    Retimes the second quarter of a key_count long animation and times the plan and apply steps separately,
+    then times planning an ease in/out time warp over the same range.
+
+    :return: list of BenchmarkResult, one per operation
+    """
+    store = KeyframeStore(key_count, curve_count)
+
+    range_start_time = FIRST_FRAME + key_count // 4
+    range_end_time = FIRST_FRAME + key_count // 2
+
+    start_time = time.time()
+    retime_plan = retiming_commands.plan_retime(store, range_start_time, range_end_time, retime_value, incremental)
+    plan_result = BenchmarkResult("plan", key_count, time.time() - start_time, store.call_count, store.command_count)
+
+    store.reset_counts()
+
+    start_time = time.time()
+    retiming_commands.apply_retime_plan(store, retime_plan)
+    store.currentTime(retime_plan.current_time)
+    apply_result = BenchmarkResult("apply", key_count, time.time() - start_time, store.call_count, store.command_count)
+
+    unmoved_count = len(retime_plan.keyframe_times) - len(retime_plan.old_keyframe_times)
+    if sorted(set(retiming_commands.query_keyframe_times(store))) != \
+            retime_plan.keyframe_times[:unmoved_count] + retime_plan.new_keyframe_times:
+        raise RuntimeError("Applied key times do not match the retime plan")
+
+    store.reset_counts()
+
+    start_time = time.time()
+    keyframe_times = sorted(set(retiming_commands.query_keyframe_times(store)))
+    new_keyframe_times = warp_keyframe_times(keyframe_times, range_start_time, range_end_time, ease_in_out)
+    build_remap_plan(keyframe_times, new_keyframe_times)
+    warp_result = BenchmarkResult("warp", key_count, time.time() - start_time, store.call_count, store.command_count)
+
+    return [plan_result, apply_result, warp_result]
+
+
+def run_merged_benchmark(key_count, curve_count=DEFAULT_CURVE_COUNT, retimes=MERGED_RETIMES):
+    """
+    Applies a burst of retimes one after the other and as a single merged plan, each on its own store, times both
+    and checks they leave the same keys and current time.
+
+    :return: list of BenchmarkResult, one per operation
+    """
+    sequential_store = KeyframeStore(key_count, curve_count)
+    merged_store = KeyframeStore(key_count, curve_count)
+
+    range_start_time = FIRST_FRAME + key_count // 4
+    range_end_time = FIRST_FRAME + key_count // 2
+
+    start_time = time.time()
+    for retime_value, incremental in retimes:
+        retime_plan = retiming_commands.plan_retime(sequential_store, range_start_time, range_end_time, retime_value,
+                                                    incremental)
+        retiming_commands.apply_retime_plan(sequential_store, retime_plan)
+        sequential_store.currentTime(retime_plan.current_time)
+    sequential_result = BenchmarkResult("clicks", key_count, time.time() - start_time, sequential_store.call_count,
+                                        sequential_store.command_count)
+
+    start_time = time.time()
+    keyframe_times = sorted(set(retiming_commands.query_keyframe_times(merged_store)))
+    retime_plan = build_merged_retime_plan(keyframe_times, range_start_time, range_end_time, retimes)
+    retiming_commands.apply_retime_plan(merged_store, retime_plan)
+    merged_store.currentTime(retime_plan.current_time)
+    merged_result = BenchmarkResult("merged", key_count, time.time() - start_time, merged_store.call_count,
+                                    merged_store.command_count)
+
+    if merged_store.curves != sequential_store.curves or \
+            merged_store.current_time != sequential_store.current_time:
+        raise RuntimeError("Merged retime does not match applying the retimes one after the other")
+
+    return [sequential_result, merged_result]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the retime plan builder and apply step.")
+    parser.add_argument("-k", "--keys", type=int, nargs="+", default=DEFAULT_KEY_COUNTS, help="key counts to run")
+    parser.add_argument("-c", "--curves", type=int, default=DEFAULT_CURVE_COUNT, help="number of anim curves")
+    args = parser.parse_args(argv)
+
+    for key_count in args.keys:
+        for result in run_benchmark(key_count, args.curves) + run_merged_benchmark(key_count, args.curves):
+            print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+from RetimingTool.retiming_planner import build_retime_plan
+
+
+def query_keyframe_times(cmds):
+    """
+    :param cmds: maya.cmds, or a stand-in with the same keyframe command
+    :return: key times of the selected objects, in any order and with duplicates
+    """
+    keyframe_times = cmds.keyframe(q=True, timeChange=True)
+    if not keyframe_times:
+        return []
+
+    return keyframe_times
+
+
+def plan_retime(cmds, range_start_time, range_end_time, retime_value, incremental, move_to_next=False):
+    keyframe_times = sorted(set(query_keyframe_times(cmds)))
+    return build_retime_plan(keyframe_times, range_start_time, range_end_time, retime_value, incremental,
+                             move_to_next)
+
+
+def get_keyframe_edit_commands(keyframe_moves, tail_shift=None, tail_shifted_first=False):
+    """
+    :return: list of MEL keyframe edit commands, in the order they must run
+    """
+    commands = []
+    for current_time, new_time in keyframe_moves:
+        commands.append("keyframe -edit -time {0!r} -timeChange {1!r};".format(current_time, new_time))
+
+    if tail_shift:
+        tail_command = "keyframe -edit -relative -time \"{0!r}:{1!r}\" -timeChange {2!r};".format(*tail_shift)
+        if tail_shifted_first:
+            commands.insert(0, tail_command)
+        else:
+            commands.append(tail_command)
+
+    return commands
+
+
+def change_keyframe_times(mel, keyframe_moves, tail_shift=None, tail_shifted_first=False):
+    """
+    :param mel: maya.mel, or a stand-in with the same eval function
+    """
+    # all moves are sent to Maya as a single MEL batch instead of one cmds.keyframe call per key
+    commands = get_keyframe_edit_commands(keyframe_moves, tail_shift, tail_shifted_first)
+    if commands:
+        mel.eval("\n".join(commands))
+
+
+def apply_retime_plan(mel, retime_plan):
+    change_keyframe_times(mel, retime_plan.keyframe_moves, retime_plan.tail_shift,
+                          retime_plan.is_tail_shifted_first())
+
+
+def retime_range(cmds, mel, range_start_time, range_end_time, retime_value, incremental):
+    """
+    :return: the RetimePlan that was applied
+    """
+    retime_plan = plan_retime(cmds, range_start_time, range_end_time, retime_value, incremental)
+    apply_retime_plan(mel, retime_plan)
+
+    return retime_plan
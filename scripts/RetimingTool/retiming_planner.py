@@ -0,0 +1,222 @@
+import bisect
+
+
+class RetimePlan(object):
+    """
+    Everything a retime will do, worked out without touching the scene.
+    """
+
+    def __init__(self, keyframe_times, old_keyframe_times, new_keyframe_times, keyframe_moves, current_time,
+                 tail_shift=None):
+        self.keyframe_times = keyframe_times
+        self.old_keyframe_times = old_keyframe_times
+        self.new_keyframe_times = new_keyframe_times
+        self.keyframe_moves = keyframe_moves
+        self.current_time = current_time
+
+        # (first_time, last_time, time_offset) of the keys after the range, which all move by the same offset
+        self.tail_shift = tail_shift
+
+    def is_tail_shifted_first(self):
+        """
+        The tail has to move out of the way before the keys in the range when it moves later,
+        and after them when it moves earlier.
+        """
+        return self.tail_shift is not None and self.tail_shift[2] > 0
+
+    def __str__(self):
+        output = ""
+        output += "Old Times: {0}\n".format(self.old_keyframe_times)
+        output += "New Times: {0}\n".format(self.new_keyframe_times)
+        output += "Moves: {0}\n".format(self.keyframe_moves)
+        output += "Tail Shift: {0}\n".format(self.tail_shift)
+        output += "Current Time: {0}\n".format(self.current_time)
+
+        return output
+
+
+def build_retime_plan(keyframe_times, range_start_time, range_end_time, retime_value, incremental, move_to_next=False):
+    """
+    :param keyframe_times: sorted, unique key times of everything being retimed
+    :return: RetimePlan, with no moves and no current time if there are no keys
+    """
+    if not keyframe_times:
+        return RetimePlan([], [], [], [], None)
+
+    start_index = get_start_keyframe_index(keyframe_times, range_start_time)
+
+    old_keyframe_times = keyframe_times[start_index:]
+    new_keyframe_times = calculate_new_keyframe_times(old_keyframe_times, retime_value, incremental, range_end_time)
+
+    # only the keys in the range are moved one by one, everything after it is shifted as a single block
+    tail_index = get_tail_index(old_keyframe_times, range_end_time)
+    keyframe_moves = plan_keyframe_moves(old_keyframe_times[:tail_index], new_keyframe_times[:tail_index])
+
+    tail_shift = None
+    if tail_index < len(old_keyframe_times):
+        time_offset = new_keyframe_times[tail_index] - old_keyframe_times[tail_index]
+        if time_offset:
+            tail_shift = (old_keyframe_times[tail_index], old_keyframe_times[-1], time_offset)
+
+    current_time = get_retimed_current_time(keyframe_times, new_keyframe_times, range_start_time, range_end_time,
+                                            move_to_next)
+
+    return RetimePlan(keyframe_times, old_keyframe_times, new_keyframe_times, keyframe_moves, current_time,
+                      tail_shift)
+
+
+def build_remap_plan(keyframe_times, new_keyframe_times):
+    """
+    Plans moving every key to an arbitrary new time. The mapping must keep the keys in order.
+
+    :param keyframe_times: sorted, unique key times
+    :param new_keyframe_times: new time for every key time
+    :return: RetimePlan covering only the keys that move, with no current time change
+    """
+    changed_indices = [i for i in range(len(keyframe_times)) if keyframe_times[i] != new_keyframe_times[i]]
+    if not changed_indices:
+        return RetimePlan(keyframe_times, [], [], [], None)
+
+    first_index = changed_indices[0]
+    last_index = changed_indices[-1] + 1
+
+    old_keyframe_times = keyframe_times[first_index:last_index]
+    new_keyframe_times = new_keyframe_times[first_index:last_index]
+
+    # keys at the end that all move by the same offset are shifted as a single block
+    tail_index = len(old_keyframe_times) - 1
+    time_offset = new_keyframe_times[tail_index] - old_keyframe_times[tail_index]
+    while tail_index > 0 and new_keyframe_times[tail_index - 1] - old_keyframe_times[tail_index - 1] == time_offset:
+        tail_index -= 1
+
+    tail_shift = None
+    if tail_index < len(old_keyframe_times) - 1:
+        tail_shift = (old_keyframe_times[tail_index], old_keyframe_times[-1], time_offset)
+    else:
+        tail_index = len(old_keyframe_times)
+
+    keyframe_moves = plan_keyframe_moves(old_keyframe_times[:tail_index], new_keyframe_times[:tail_index])
+
+    return RetimePlan(keyframe_times, old_keyframe_times, new_keyframe_times, keyframe_moves, None, tail_shift)
+
+
+def get_start_keyframe_index(keyframe_times, range_start_time):
+    start_index = bisect.bisect_right(keyframe_times, range_start_time) - 1
+    if start_index < 0:
+        # matches findKeyframe "previous", which wraps around to the last key
+        start_index = len(keyframe_times) - 1
+
+    return start_index
+
+
+def get_tail_index(keyframe_times, range_end_time):
+    """
+    :return: index of the first key that follows a key at or after the range end. That key and every key after it
+             keep their spacing, so they all move by the same offset.
+    """
+    return min(bisect.bisect_left(keyframe_times, range_end_time) + 1, len(keyframe_times))
+
+
+def calculate_new_keyframe_times(keyframe_times, retime_value, incremental, range_end_time):
+    new_keyframe_times = [keyframe_times[0]]
+
+    for i in range(1, len(keyframe_times)):
+        current_time = keyframe_times[i - 1]
+        next_keyframe_time = keyframe_times[i]
+
+        if incremental:
+            time_diff = next_keyframe_time - current_time
+            if current_time < range_end_time:
+                time_diff += retime_value
+                if time_diff < 1:
+                    time_diff = 1
+        else:
+            if current_time < range_end_time:
+                time_diff = retime_value
+            else:
+                time_diff = next_keyframe_time - current_time
+
+        new_keyframe_times.append(new_keyframe_times[-1] + time_diff)
+
+    return new_keyframe_times
+
+
+def get_retimed_current_time(keyframe_times, new_keyframe_times, range_start_time, range_end_time, move_to_next):
+    # keys before the start keyframe are never moved, so the first keyframe is unchanged
+    first_keyframe_time = keyframe_times[0]
+
+    if move_to_next and range_start_time >= first_keyframe_time:
+        if len(new_keyframe_times) > 1:
+            return new_keyframe_times[1]
+
+        # findKeyframe "next" wraps around to the first key
+        return first_keyframe_time
+    elif range_end_time > first_keyframe_time:
+        return new_keyframe_times[0]
+
+    return range_start_time
+
+
+def plan_keyframe_moves(old_keyframe_times, new_keyframe_times):
+    """
+    Returns the order in which keys must be moved so that no key lands on a time still occupied by another key.
+
+    Keys that move to a time before the old time of their successor are moved on the way forward, every other key
+    is moved on the way back, in reverse. This matches the order of the old recursive implementation but runs in
+    linear time without any recursion.
+
+    :param old_keyframe_times: sorted, unique key times
+    :param new_keyframe_times: strictly increasing new times, one per old time
+    :return: list of (old_time, new_time) tuples, keys that do not move are skipped
+    """
+    if len(old_keyframe_times) != len(new_keyframe_times):
+        raise ValueError("Old and new keyframe time lists must be the same length")
+
+    keyframe_moves = []
+    deferred_moves = []
+
+    last_index = len(old_keyframe_times) - 1
+    for i in range(len(old_keyframe_times)):
+        old_time = old_keyframe_times[i]
+        new_time = new_keyframe_times[i]
+        if old_time == new_time:
+            continue
+
+        if i < last_index and new_time < old_keyframe_times[i + 1]:
+            keyframe_moves.append((old_time, new_time))
+        else:
+            deferred_moves.append((old_time, new_time))
+
+    deferred_moves.reverse()
+    keyframe_moves.extend(deferred_moves)
+
+    return keyframe_moves
+
+
+def build_merged_retime_plan(keyframe_times, range_start_time, range_end_time, retimes):
+    """
+    Plans a burst of retimes over the same range as a single remap. Each retime is worked out in memory from the
+    times the one before it left, so the result is the same as applying them one after the other.
+
+    :param keyframe_times: sorted, unique key times of everything being retimed
+    :param retimes: list of (retime_value, incremental), in the order they were made
+    :return: RetimePlan, with no moves and no current time if there are no keys
+    """
+    if not keyframe_times:
+        return RetimePlan([], [], [], [], None)
+
+    new_keyframe_times = keyframe_times
+    current_time = None
+    for retime_value, incremental in retimes:
+        retime_plan = build_retime_plan(new_keyframe_times, range_start_time, range_end_time, retime_value,
+                                        incremental)
+
+        # keys before the start keyframe keep their time
+        unmoved_count = len(new_keyframe_times) - len(retime_plan.old_keyframe_times)
+        new_keyframe_times = new_keyframe_times[:unmoved_count] + retime_plan.new_keyframe_times
+        current_time = retime_plan.current_time
+
+    retime_plan = build_remap_plan(keyframe_times, new_keyframe_times)
+    retime_plan.current_time = current_time
+
+    return retime_plan
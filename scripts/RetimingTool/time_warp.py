@@ -0,0 +1,108 @@
+import numpy as np
+
+
+def ease_in(u):
+    return u * u
+
+
+def ease_out(u):
+    return 1.0 - (1.0 - u) * (1.0 - u)
+
+
+def ease_in_out(u):
+    return u * u * (3.0 - 2.0 * u)
+
+
+class SplineTimeWarp(object):
+    """
+    Monotone cubic (Fritsch-Carlson) spline through user control points, so the warp never reorders keys.
+    """
+
+    def __init__(self, points):
+        """
+        :param points: (u, warped_u) pairs, starting at (0, 0), ending at (1, 1) and increasing in both values
+        """
+        points = np.asarray(sorted(points), dtype=np.float64)
+        if points.ndim != 2 or points.shape[0] < 2 or points.shape[1] != 2:
+            raise ValueError("Time warp spline requires at least two (u, warped_u) points")
+
+        self.x = points[:, 0]
+        self.y = points[:, 1]
+
+        if self.x[0] != 0.0 or self.x[-1] != 1.0 or self.y[0] != 0.0 or self.y[-1] != 1.0:
+            raise ValueError("Time warp spline must start at (0, 0) and end at (1, 1)")
+        if np.any(np.diff(self.x) <= 0.0) or np.any(np.diff(self.y) <= 0.0):
+            raise ValueError("Time warp spline points must be increasing")
+
+        self.h = np.diff(self.x)
+        delta = np.diff(self.y) / self.h
+
+        tangents = np.empty_like(self.x)
+        tangents[0] = delta[0]
+        tangents[-1] = delta[-1]
+        tangents[1:-1] = 0.5 * (delta[:-1] + delta[1:])
+
+        # limit the tangents so each segment stays monotone
+        alpha = tangents[:-1] / delta
+        beta = tangents[1:] / delta
+        scale = np.hypot(alpha, beta)
+        limit = np.where(scale > 3.0, 3.0 / scale, 1.0)
+        tangents[:-1] = np.minimum(tangents[:-1], limit * alpha * delta)
+        tangents[1:] = np.minimum(tangents[1:], limit * beta * delta)
+
+        self.tangents = tangents
+
+    def __call__(self, u):
+        index = np.clip(np.searchsorted(self.x, u, side="right") - 1, 0, len(self.x) - 2)
+
+        h = self.h[index]
+        t = (u - self.x[index]) / h
+        t2 = t * t
+        t3 = t2 * t
+
+        return ((2.0 * t3 - 3.0 * t2 + 1.0) * self.y[index] +
+                (t3 - 2.0 * t2 + t) * h * self.tangents[index] +
+                (-2.0 * t3 + 3.0 * t2) * self.y[index + 1] +
+                (t3 - t2) * h * self.tangents[index + 1])
+
+
+TIME_WARPS = [("Ease In", ease_in), ("Ease Out", ease_out), ("Ease In Out", ease_in_out)]
+
+
+def parse_spline_points(text):
+    """
+    :param text: control points as "u,warped_u" pairs separated by spaces, e.g. "0,0 0.5,0.8 1,1"
+    """
+    try:
+        return [tuple(float(value) for value in pair.split(",")) for pair in text.split()]
+    except ValueError:
+        raise ValueError("Invalid time warp spline points: {0}".format(text))
+
+
+def warp_keyframe_times(keyframe_times, range_start_time, range_end_time, time_warp, snap_to_frames=False):
+    """
+    Maps the key times inside the range through the time warp, keys outside of it keep their time.
+
+    :param keyframe_times: sorted, unique key times
+    :param time_warp: callable mapping a NumPy array of normalized times to warped normalized times
+    :param snap_to_frames: round the warped times to whole frames
+    :return: list of new key times, one per key time
+    """
+    times = np.asarray(keyframe_times, dtype=np.float64)
+    range_length = float(range_end_time - range_start_time)
+    if range_length <= 0.0 or not len(times):
+        return list(keyframe_times)
+
+    in_range = (times > range_start_time) & (times < range_end_time)
+
+    new_times = times.copy()
+    u = (times[in_range] - range_start_time) / range_length
+    new_times[in_range] = range_start_time + np.asarray(time_warp(u), dtype=np.float64) * range_length
+
+    if snap_to_frames:
+        new_times[in_range] = np.round(new_times[in_range])
+
+    if np.any(np.diff(new_times) <= 0.0):
+        raise ValueError("Time warp would move keys onto each other, try a larger range or disable snapping")
+
+    return new_times.tolist()
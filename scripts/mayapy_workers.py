@@ -0,0 +1,156 @@
+import concurrent.futures
+import json
+import os
+import subprocess
+import time
+
+
+DEFAULT_MAYAPY = "mayapy"
+DEFAULT_WORKER_COUNT = 4
+
+
+class WorkerJob(object):
+    """
+    Base for the jobs run by the pool, holding the outcome of the latest attempt.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+        self.attempts = 0
+        self.return_code = None
+        self.duration = 0.0
+        self.log_path = None
+
+    def succeeded(self):
+        return self.return_code == 0
+
+
+def load_manifest(manifest_path, parse_manifest):
+    """
+    :param parse_manifest: callable taking (manifest, base_dir), paths in the manifest are relative to base_dir
+    """
+    with open(manifest_path, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    return parse_manifest(manifest, os.path.dirname(os.path.abspath(manifest_path)))
+
+
+def run_worker(worker, job, log_path):
+    """
+    :return: (job, log_path, return_code, duration). A worker that raises is logged and returns -1.
+    """
+    start_time = time.time()
+    try:
+        return_code = worker(job, log_path)
+    except Exception as e:
+        with open(log_path, "a") as log_file:
+            log_file.write("Worker failed to run: {0}\n".format(e))
+        return_code = -1
+
+    return job, log_path, return_code, time.time() - start_time
+
+
+def run_pool(worker, worker_count, get_next_job, on_job_finished):
+    """
+    Runs jobs through the worker across a pool of worker_count processes. Whenever a worker is free the next job
+    is asked for, so jobs queued again while the pool runs, such as retries, are picked up.
+
+    get_next_job and on_job_finished are only called in the calling thread.
+
+    :param worker: callable taking (job, log_path) and returning an exit code
+    :param get_next_job: callable returning (job, log_path) for the next job to start, or None if there is none
+    :param on_job_finished: callable taking (job, log_path, return_code, duration)
+    """
+    worker_count = max(1, worker_count)
+
+    # the workers are separate processes, threads only wait on them
+    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
+        running = set()
+        while True:
+            while len(running) < worker_count:
+                next_job = get_next_job()
+                if not next_job:
+                    break
+
+                job, log_path = next_job
+                running.add(executor.submit(run_worker, worker, job, log_path))
+
+            if not running:
+                break
+
+            done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                on_job_finished(*future.result())
+
+
+def print_summary(jobs, description):
+    """
+    :param description: format string for the totals, taking the succeeded and failed counts
+    """
+    failed_jobs = [job for job in jobs if not job.succeeded()]
+
+    print("")
+    for job in jobs:
+        status = "OK" if job.succeeded() else "FAILED ({0})".format(job.return_code)
+        print("{0:<12} {1:>8.1f}s  {2} attempt(s)  {3}  [{4}]".format(status, job.duration, job.attempts, job.job_id,
+                                                                      job.log_path))
+
+    print("")
+    print(description.format(len(jobs) - len(failed_jobs), len(failed_jobs)))
+
+
+class MayapyWorker(object):
+    """
+    Runs a job in a separate mayapy process, writing the process output to the job log. The job is passed to the
+    process as JSON after a --worker flag.
+    """
+
+    def __init__(self, script_args, python_paths=(), mayapy_path=DEFAULT_MAYAPY):
+        """
+        :param script_args: arguments that run the worker script, e.g. ["-m", "RetimingTool.batch_retime"]
+        :param python_paths: directories the worker imports from, this module's directory is always added
+        """
+        self.script_args = list(script_args)
+        self.python_paths = list(python_paths)
+        self.mayapy_path = mayapy_path
+
+    def __call__(self, job, log_path):
+        python_paths = self.python_paths + [os.path.dirname(os.path.abspath(__file__))]
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(python_paths + [p for p in [env.get("PYTHONPATH")] if p])
+
+        args = [self.mayapy_path] + self.script_args + ["--worker", json.dumps(job.to_dict())]
+        with open(log_path, "w") as log_file:
+            return subprocess.call(args, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+
+
+class FakeWorker(object):
+    """
+    Stand-in for MayapyWorker that records the jobs it was given instead of starting mayapy.
+    """
+
+    def __init__(self, return_codes=None, duration=0.0):
+        """
+        :param return_codes: optional dict of job id to the list of exit codes returned by successive attempts,
+                             jobs that are missing or out of codes succeed
+        :param duration: seconds each attempt takes
+        """
+        self.return_codes = dict((job_id, list(codes)) for job_id, codes in (return_codes or {}).items())
+        self.duration = duration
+        self.calls = []
+
+    def __call__(self, job, log_path):
+        self.calls.append(job.job_id)
+
+        if self.duration:
+            time.sleep(self.duration)
+
+        codes = self.return_codes.get(job.job_id)
+        return_code = codes.pop(0) if codes else 0
+
+        with open(log_path, "w") as log_file:
+            log_file.write("Fake run of {0}: exit code {1}\n".format(job.job_id, return_code))
+
+        return return_code